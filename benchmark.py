@@ -0,0 +1,207 @@
+# import library
+import argparse
+import http.client
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+import config
+from droneapp.controllers import server
+from droneapp.models.drone_manager import DroneManager
+from simulator import TelloSimulator
+
+logger = logging.getLogger(__name__)
+
+# jumlah penonton yang diuji bersamaan
+DEFAULT_VIEWERS = (1, 4, 16)
+
+
+# fungsi untuk menghitung persentil dari daftar angka
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {}
+    values = sorted(values)
+    result = {}
+    for point in points:
+        index = min(len(values) - 1, int(round(point / 100 * (len(values) - 1))))
+        result[f'p{point}'] = values[index]
+    result['max'] = values[-1]
+    result['count'] = len(values)
+    return result
+
+
+# fungsi untuk mengambil versi kode yang sedang diuji
+def git_version():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=config.PROJECT_ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# fungsi untuk mengukur waktu pulang-pergi perintah
+def bench_commands(drone, count, command):
+    rtts = []
+    statuses = {}
+    for _ in range(count):
+        result = drone.send_command(command).result()
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+        if result.rtt is not None:
+            rtts.append(result.rtt * 1000)
+    return {'command': command, 'rtt_ms': percentiles(rtts),
+            'status': statuses}
+
+
+# fungsi untuk mengukur laju decode, deteksi dan encode
+def bench_pipeline(drone, duration, is_face_detect):
+    if is_face_detect:
+        drone.enable_face_detect()
+    else:
+        drone.disable_face_detect()
+    before = drone.video_stats()
+    detect_before = drone.detection_stats()
+    encode_samples = []
+    started = time.monotonic()
+    while time.monotonic() - started < duration:
+        time.sleep(0.1)
+        encode_samples.append(drone.video_stats()['encode_ms'])
+    elapsed = time.monotonic() - started
+    after = drone.video_stats()
+    detect_after = drone.detection_stats()
+
+    detections = detect_after['detections'] - detect_before['detections']
+    result = {'face_detect': is_face_detect,
+              'decoded_fps': (after['frames'] - before['frames']) / elapsed,
+              'encode_ms': percentiles(encode_samples)}
+    if is_face_detect:
+        result['detections_per_second'] = detections / elapsed
+        result['detect_ms'] = detect_after['detect_avg_ms']
+    return result
+
+
+# fungsi untuk membaca stream MJPEG seperti browser
+def read_mjpeg(address, duration, stats):
+    connection = http.client.HTTPConnection(*address, timeout=5)
+    connection.request('GET', '/video/streaming')
+    response = connection.getresponse()
+    started = time.monotonic()
+    try:
+        while time.monotonic() - started < duration:
+            line = response.readline()
+            if not line:
+                break
+            if line.strip() != b'--frame':
+                continue
+            headers = {}
+            while True:
+                line = response.readline().strip()
+                if not line:
+                    break
+                key, _, value = line.decode().partition(':')
+                headers[key.strip().lower()] = value.strip()
+            jpeg = response.read(int(headers['content-length']))
+            received = time.time()
+            stats['frames'] += 1
+            stats['bytes'] += len(jpeg)
+            if 'x-timestamp' in headers:
+                stats['age_ms'].append(
+                    (received - float(headers['x-timestamp'])) * 1000)
+    except OSError as ex:
+        logger.warning({'action': 'read_mjpeg', 'ex': ex})
+    finally:
+        stats['elapsed'] = time.monotonic() - started
+        connection.close()
+
+
+# fungsi untuk mengukur fps dan umur frame untuk banyak penonton
+def bench_viewers(address, viewers, duration):
+    stats = [{'frames': 0, 'bytes': 0, 'age_ms': [], 'elapsed': 0.0}
+             for _ in range(viewers)]
+    threads = [threading.Thread(target=read_mjpeg,
+                                args=(address, duration, stat), daemon=True)
+               for stat in stats]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + 10)
+
+    fps = [stat['frames'] / stat['elapsed'] for stat in stats
+           if stat['elapsed']]
+    ages = [age for stat in stats for age in stat['age_ms']]
+    return {'viewers': viewers,
+            'fps_per_client': percentiles(fps, (0, 50, 100)),
+            'frame_age_ms': percentiles(ages),
+            'bytes': sum(stat['bytes'] for stat in stats)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='End-to-end benchmark against the Tello simulator')
+    parser.add_argument('--video', help='H.264 Annex-B file to stream')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--command', default='battery?')
+    parser.add_argument('--viewers', default=','.join(
+        str(viewers) for viewers in DEFAULT_VIEWERS))
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--web-port', type=int, default=5055)
+    parser.add_argument('--drone-port', type=int, default=8889)
+    parser.add_argument('--host-port', type=int, default=9000)
+    parser.add_argument('--video-port', type=int, default=11111)
+    parser.add_argument('--state-port', type=int, default=8890)
+    args = parser.parse_args(argv)
+
+    simulator = TelloSimulator(video_file=args.video, latency=args.latency,
+                               jitter=args.jitter, loss=args.loss,
+                               command_port=args.drone_port,
+                               video_port=args.video_port,
+                               state_port=args.state_port)
+    simulator.start()
+
+    # DroneManager adalah singleton, server akan memakai instance ini
+    # decode dibuat selalu berjalan agar laju pipeline bisa diukur
+    # walaupun belum ada penonton
+    drone = DroneManager(host_ip='127.0.0.1', host_port=args.host_port,
+                         drone_ip='127.0.0.1', drone_port=args.drone_port,
+                         video_port=args.video_port,
+                         state_port=args.state_port, decode_on_demand=False)
+    httpd = make_server('127.0.0.1', args.web_port, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    results = {'version': git_version(), 'timestamp': time.time(),
+               'config': vars(args)}
+    try:
+        time.sleep(1)
+        results['commands'] = bench_commands(drone, args.commands, args.command)
+        if args.video:
+            results['pipeline'] = [
+                bench_pipeline(drone, args.duration, False),
+                bench_pipeline(drone, args.duration, True)]
+            drone.disable_face_detect()
+            results['mjpeg'] = [
+                bench_viewers(('127.0.0.1', args.web_port), int(viewers),
+                              args.duration)
+                for viewers in args.viewers.split(',')]
+    finally:
+        httpd.shutdown()
+        simulator.stop()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    drone.stop()
+    print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stdout)
+    logging.getLogger().setLevel(logging.WARNING)
+    main()
@@ -1,3 +1,4 @@
+import json
 import os
 
 from flask import Flask
@@ -11,6 +12,20 @@ STATIC_FOLDER = os.path.join(PROJECT_ROOT, 'droneapp/static')
 DEBUG = False
 LOG_FILE = 'pytello.log'
 
+# alamat komputer dan drone, bisa diarahkan ke simulator.py lewat environment
+HOST_IP = os.environ.get('DRONE_HOST_IP', '192.168.10.2')
+HOST_PORT = int(os.environ.get('DRONE_HOST_PORT', 8889))
+DRONE_IP = os.environ.get('DRONE_IP', '192.168.10.1')
+DRONE_PORT = int(os.environ.get('DRONE_PORT', 8889))
+VIDEO_PORT = int(os.environ.get('DRONE_VIDEO_PORT', 11111))
+STATE_PORT = int(os.environ.get('DRONE_STATE_PORT', 8890))
+
+# daftar drone untuk /api/drones/, setiap drone butuh port lokal sendiri
+# contoh: [{"id": "a", "drone_ip": "192.168.1.11", "command_port": 9001,
+#           "state_port": 9101, "video_port": 11201}]
+FLEET_HOST_IP = os.environ.get('DRONE_FLEET_HOST_IP', '0.0.0.0')
+FLEET = json.loads(os.environ.get('DRONE_FLEET', '[]'))
+
 app = Flask(__name__,
             template_folder=TEMPLATES,
             static_folder=STATIC_FOLDER)
@@ -1,4 +1,8 @@
+from concurrent.futures import Future
+import datetime
 import logging
+import math
+import time
 
 from flask import jsonify
 from flask import render_template
@@ -6,6 +10,24 @@ from flask import request
 from flask import Response
 
 from droneapp.models.drone_manager import DroneManager
+from droneapp.models.fleet import ErrorUnknownDrone
+from droneapp.models.fleet import FleetManager
+from droneapp.models.metrics import REGISTRY
+from droneapp.models.mission import ErrorInvalidMission
+from droneapp.models.mission import loads_mission
+from droneapp.models.mission import MISSIONS
+from droneapp.models.mission import parse_mission
+from droneapp.models.profiler import DEFAULT_PROFILE_HZ
+from droneapp.models.profiler import DEFAULT_PROFILE_SECONDS
+from droneapp.models.profiler import ErrorProfilerBusy
+from droneapp.models.profiler import MAX_PROFILE_HZ
+from droneapp.models.profiler import MAX_PROFILE_SECONDS
+from droneapp.models.profiler import PROFILER
+from droneapp.models.telemetry import ErrorUnknownStateField
+from droneapp.models.telemetry import MAX_STATE_WINDOW
+from droneapp.models.video import DELIVERY_TIERS
+from droneapp.models.video import DeliveryPolicy
+from droneapp.models.video import frame_age_histogram
 
 import config
 
@@ -13,9 +35,127 @@ import config
 logger = logging.getLogger(__name__)
 app = config.app
 
+DELIVERED_AGE = frame_age_histogram('delivered')
+DELIVERED_FRAMES = [
+    REGISTRY.counter('video_delivered_frames',
+                     'MJPEG frames written to viewers by quality tier',
+                     {'tier': str(tier)})
+    for tier in range(len(DELIVERY_TIERS))]
+
+# perintah dari halaman controller: nama -> (method DroneManager, parameter)
+# parameter yang tidak dikirim memakai nilai bawaan method
+COMMANDS = {
+    'takeOff': ('takeoff', ()),
+    'land': ('land', ()),
+    'speed': ('set_speed', ('speed', )),
+    'up': ('up', ('distance', )),
+    'down': ('down', ('distance', )),
+    'forward': ('forward', ('distance', )),
+    'back': ('back', ('distance', )),
+    'left': ('left', ('distance', )),
+    'right': ('right', ('distance', )),
+    'clockwise': ('clockwise', ('degree', )),
+    'counterClockwise': ('counter_clockwise', ('degree', )),
+    'flipFront': ('flip_front', ()),
+    'flipBack': ('flip_back', ()),
+    'flipLeft': ('flip_left', ()),
+    'flipRight': ('flip_right', ()),
+    'patrol': ('patrol', ()),
+    'stopPatrol': ('stop_patrol', ()),
+    'faceDetectAndTrack': ('enable_face_detect', ()),
+    'stopFaceDetectAndTrack': ('disable_face_detect', ()),
+}
+# tipe dan rentang parameter (minimal, maksimal), None berarti tanpa batas
+# jarak harus lebih dari 0, kecepatan dan sudut sesuai batas SDK Tello
+COMMAND_PARAMS = {
+    'speed': (int, 10, 100),
+    'distance': (float, 0, None),
+    'degree': (int, 1, 360),
+}
+REQUIRED_PARAMS = {'set_speed': ('speed', )}
+
+# batas jumlah perintah dalam satu batch
+MAX_BATCH_COMMANDS = 32
+
 
 def get_drone():
-    return DroneManager()
+    return DroneManager(host_ip=config.HOST_IP, host_port=config.HOST_PORT,
+                        drone_ip=config.DRONE_IP, drone_port=config.DRONE_PORT,
+                        video_port=config.VIDEO_PORT,
+                        state_port=config.STATE_PORT)
+
+# fungsi untuk memeriksa nama dan parameter perintah dari controller
+# mengembalikan (nama method, kwargs), ValueError jika tidak valid
+# jarak diperiksa dalam cm oleh drone sesuai satuan yang dipakai
+def parse_command(cmd, params, drone):
+    if not isinstance(cmd, str) or cmd not in COMMANDS:
+        raise ValueError(f'unknown command: {cmd}')
+    method, names = COMMANDS[cmd]
+    kwargs = {}
+    for name in names:
+        value = params.get(name)
+        if value is None or value == '':
+            continue
+        kind, minimum, maximum = COMMAND_PARAMS[name]
+        # angka bulat dari form ('90') atau JSON (90) diperlakukan sama,
+        # 90.9 atau '12.5' ditolak, bukan dibulatkan
+        try:
+            if isinstance(value, bool):
+                raise ValueError(value)
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'invalid {name} for {cmd}: {value}')
+        if not math.isfinite(number) or (kind is int
+                                         and not number.is_integer()):
+            raise ValueError(f'invalid {name} for {cmd}: {value}')
+        number = kind(number)
+        if ((kind is float and number <= minimum)
+                or (kind is int and number < minimum)
+                or (maximum is not None and number > maximum)):
+            raise ValueError(f'{name} out of range for {cmd}: {value}')
+        if name == 'distance':
+            drone.distance_to_cm(number)
+        kwargs[name] = number
+    missing = [name for name in REQUIRED_PARAMS.get(method, ())
+               if name not in kwargs]
+    if missing:
+        raise ValueError(f'{cmd} needs {", ".join(missing)}')
+    return method, kwargs
+
+# fungsi untuk menjalankan daftar perintah secara berurutan
+# perintah berikutnya dikirim begitu drone menjawab perintah sebelumnya,
+# jika stop_on_error sisa perintah dilewati setelah ada yang gagal
+def run_batch(drone, calls, stop_on_error=True):
+    results = []
+    is_failed = False
+    for cmd, method, kwargs in calls:
+        if is_failed:
+            results.append({'command': cmd, 'status': 'skipped'})
+            continue
+        result = {'command': cmd, 'status': 'ok'}
+        outcome = getattr(drone, method)(**kwargs)
+        if isinstance(outcome, Future):
+            command_result = outcome.result()
+            result.update(status=command_result.status,
+                          response=command_result.response,
+                          rtt=command_result.rtt,
+                          attempts=command_result.attempts)
+        results.append(result)
+        is_failed = stop_on_error and result['status'] != 'ok'
+    return results
+
+def get_fleet():
+    return FleetManager(host_ip=config.FLEET_HOST_IP, drones=config.FLEET)
+
+# fungsi untuk membaca misi dari ?name= atau body JSON/YAML request
+def request_mission():
+    name = request.args.get('name')
+    if name is not None:
+        if name not in MISSIONS:
+            raise ErrorInvalidMission(f'unknown mission: {name}')
+        return parse_mission(MISSIONS[name])
+    is_yaml = 'yaml' in (request.mimetype or '')
+    return loads_mission(request.get_data(as_text=True), is_yaml)
 
 @app.route('/')
 def index():
@@ -30,62 +170,248 @@ def command():
     cmd = request.form.get('command')
     logger.info({'action': 'command', 'cmd': cmd})
     drone = get_drone()
-    if cmd == 'takeOff':
-        drone.takeoff()
-    if cmd == 'land':
-        drone.land()
-    if cmd == 'speed':
-        speed = request.form.get('speed')
-        logger.info({'action': 'command', 'cmd': cmd, 'speed': speed})
-        if speed:
-            drone.set_speed(int(speed))
-
-    if cmd == 'up':
-        drone.up()
-    if cmd == 'down':
-        drone.down()
-    if cmd == 'forward':
-        drone.forward()
-    if cmd == 'back':
-        drone.back()
-    if cmd == 'clockwise':
-        drone.clockwise()
-    if cmd == 'counterClockwise':
-        drone.counter_clockwise()
-    if cmd == 'left':
-        drone.left()
-    if cmd == 'right':
-        drone.right()
-    if cmd == 'flipFront':
-        drone.flip_front()
-    if cmd == 'flipBack':
-        drone.flip_back()
-    if cmd == 'flipLeft':
-        drone.flip_left()
-    if cmd == 'flipRight':
-        drone.flip_right()
-    if cmd == 'patrol':
-        drone.patrol()
-    if cmd == 'stopPatrol':
-        drone.stop_patrol()
-    if cmd == 'faceDetectAndTrack':
-        drone.enable_face_detect()
-    if cmd == 'stopFaceDetectAndTrack':
-        drone.disable_face_detect()
+    try:
+        method, kwargs = parse_command(cmd, request.form, drone)
+    except ValueError as ex:
+        return jsonify(status='error', message=str(ex)), 400
+    getattr(drone, method)(**kwargs)
+    return jsonify(status='success'), 200
+
+# menjalankan beberapa perintah berurutan dalam satu request
+# body: {"commands": [{"command": "up", "distance": 0.5}, ...],
+#        "stop_on_error": true}
+# hasil per perintah berisi status, respon drone dan rtt
+@app.route('/api/command/batch', methods=['POST'])
+def command_batch():
+    body = request.get_json(silent=True)
+    items = body.get('commands') if isinstance(body, dict) else body
+    if not isinstance(items, list) or not items:
+        return jsonify(status='error', message='commands must be a list'), 400
+    if len(items) > MAX_BATCH_COMMANDS:
+        return jsonify(status='error', message=(
+            f'at most {MAX_BATCH_COMMANDS} commands per batch')), 400
+
+    # semua perintah diperiksa dulu agar batch tidak berhenti di tengah
+    drone = get_drone()
+    calls = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'command': item}
+        if not isinstance(item, dict):
+            return jsonify(status='error',
+                           message=f'command {index} must be an object'), 400
+        try:
+            calls.append((item.get('command'),
+                          *parse_command(item.get('command'), item, drone)))
+        except ValueError as ex:
+            return jsonify(status='error',
+                           message=f'command {index}: {ex}'), 400
+
+    stop_on_error = True
+    if isinstance(body, dict):
+        stop_on_error = bool(body.get('stop_on_error', True))
+    started = time.monotonic()
+    results = run_batch(get_drone(), calls, stop_on_error)
+    logger.info({'action': 'command_batch', 'commands': len(calls),
+                 'elapsed': time.monotonic() - started})
+    is_ok = all(result['status'] == 'ok' for result in results)
+    return jsonify(status='success' if is_ok else 'error',
+                   elapsed=time.monotonic() - started, results=results)
+
+# menjalankan misi dari body JSON/YAML atau misi bawaan dengan ?name=patrol
+@app.route('/api/mission/', methods=['GET', 'POST'])
+def mission():
+    drone = get_drone()
+    if request.method == 'GET':
+        return jsonify(drone.mission_status())
+
+    try:
+        mission = request_mission()
+    except ErrorInvalidMission as ex:
+        return jsonify(status='error', message=str(ex)), 400
+    drone.run_mission(mission)
+    return jsonify(drone.mission_status()), 202
+
+@app.route('/api/mission/stop', methods=['POST'])
+def stop_mission():
+    drone = get_drone()
+    drone.stop_mission()
+    return jsonify(drone.mission_status())
+
+@app.route('/api/metrics/')
+def metrics():
+    return Response(REGISTRY.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+# merekam stack semua thread selama beberapa detik dalam format collapsed
+# stack, bisa langsung dibuka dengan flamegraph.pl atau speedscope
+@app.route('/api/profile/')
+def profile():
+    seconds = request.args.get('seconds', DEFAULT_PROFILE_SECONDS, type=float)
+    hz = request.args.get('hz', DEFAULT_PROFILE_HZ, type=float)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0 < hz <= MAX_PROFILE_HZ:
+        return jsonify(status='error', message='invalid seconds or hz'), 400
 
+    get_drone()
+    try:
+        folded = PROFILER.capture(seconds, hz)
+    except ErrorProfilerBusy as ex:
+        return jsonify(status='error', message=str(ex)), 409
+    return Response(folded, mimetype='text/plain', headers={
+        'Content-Disposition': 'attachment; filename=profile.folded'})
+
+# status drone dari port 8890 tanpa mengirim perintah ke drone
+# ?window=detik mengembalikan deret waktu, &summary=1 hanya min/mean/max
+# ?fields=bat,h membatasi field yang dikembalikan
+@app.route('/api/state/')
+def state():
+    drone = get_drone()
+    window = request.args.get('window', type=float)
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else None
+    try:
+        if window is None:
+            latest = drone.latest_state(fields)
+            if latest is None:
+                return jsonify(status='error', message='no state yet'), 503
+            return jsonify(latest)
+
+        if not 0 < window <= MAX_STATE_WINDOW:
+            return jsonify(status='error', message='invalid window'), 400
+        if request.args.get('summary'):
+            return jsonify(drone.state_summary(window, fields))
+        values = drone.state_window(window, fields)
+    except ErrorUnknownStateField as ex:
+        return jsonify(status='error', message=str(ex)), 400
+    # NaN (field tidak dikirim drone) tidak valid di JSON
+    return jsonify({name: [None if value != value else value
+                           for value in column.tolist()]
+                    for name, column in values.items()})
+
+# daftar wajah yang dilacak beserta ID dan target yang diikuti drone
+@app.route('/api/tracks/')
+def tracks():
+    return jsonify(get_drone().face_tracks())
+
+# memilih target: policy=largest|center, atau policy=id&id=<track id>
+@app.route('/api/tracks/select', methods=['POST'])
+def select_track():
+    policy = request.form.get('policy', 'id')
+    track_id = request.form.get('id', type=int)
+    try:
+        get_drone().set_target_policy(policy, track_id)
+    except ValueError as ex:
+        return jsonify(status='error', message=str(ex)), 400
     return jsonify(status='success'), 200
 
-def video_generator():
+# mengembalikan jpeg terakhir dari hub tanpa decode atau encode baru
+# klien bisa memakai If-None-Match / If-Modified-Since untuk mendapat 304
+@app.route('/api/snapshot')
+def snapshot():
+    encoded = get_drone().latest_encoded_frame()
+    if encoded is None:
+        return jsonify(status='error', message='no frame yet'), 503, {
+            'Retry-After': '1'}
+
+    response = Response(encoded.jpeg, mimetype='image/jpeg', headers={
+        'Cache-Control': 'no-cache',
+        'X-Timestamp': f'{encoded.timestamp:.6f}'})
+    response.set_etag(str(encoded.seq))
+    response.last_modified = datetime.datetime.fromtimestamp(
+        encoded.timestamp, datetime.timezone.utc)
+    return response.make_conditional(request)
+
+# setiap penonton punya aturan pengiriman sendiri, tingkat kualitas turun
+# jika klien lambat menerima frame dan naik lagi jika sudah lancar
+def video_generator(tier=0):
     drone = get_drone()
-    for jpeg in drone.video_jpeg_generator():
+    policy = DeliveryPolicy(tier=tier)
+    for encoded in drone.video_frame_generator():
+        if not policy.should_send(time.monotonic()):
+            continue
+        tier = policy.tier
+        jpeg = drone.encode_for_tier(encoded, tier)
+        if jpeg is None:
+            continue
+
+        started = time.monotonic()
         yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' +
+               b'Content-Type: image/jpeg\r\n' +
+               f'Content-Length: {len(jpeg)}\r\n'
+               f'X-Timestamp: {encoded.timestamp:.6f}\r\n\r\n'.encode() +
                jpeg +
                b'\r\n\r\n')
+        # generator dilanjutkan setelah frame selesai ditulis ke klien
+        policy.record(started, time.monotonic())
+        DELIVERED_AGE.observe(time.time() - encoded.timestamp)
+        DELIVERED_FRAMES[tier].inc()
 
 @app.route('/video/streaming')
 def video_feed():
-    return Response(video_generator(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    tier = request.args.get('tier', 0, type=int)
+    return Response(video_generator(tier), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+# meneruskan stream H.264 asli dari drone (Annex-B) tanpa decode dan encode
+# setiap penonton mulai dari frame IDR, bisa diputar dengan ffplay atau
+# dengan WebCodecs/MSE di browser
+@app.route('/video/h264')
+def video_h264():
+    drone = get_drone()
+    return Response(drone.video_h264_generator(), mimetype='video/h264',
+                    headers={'Cache-Control': 'no-cache'})
+
+# daftar drone di fleet, semua dilayani satu thread I/O
+@app.route('/api/drones/')
+def drones():
+    return jsonify([session.stats() for session in get_fleet().sessions()])
+
+@app.errorhandler(ErrorUnknownDrone)
+def unknown_drone(ex):
+    return jsonify(status='error', message=str(ex)), 404
+
+# mengirim perintah SDK mentah ke satu drone dan menunggu jawabannya
+@app.route('/api/drones/<drone_id>/command', methods=['POST'])
+def drone_command(drone_id):
+    session = get_fleet().get(drone_id)
+    cmd = request.form.get('command', '').strip()
+    if not cmd:
+        return jsonify(status='error', message='no command'), 400
+    result = session.send_command(cmd).result()
+    logger.info({'action': 'drone_command', 'drone': drone_id,
+                 'cmd': cmd, 'status': result.status})
+    return jsonify(result._asdict()), 200 if result.status == 'ok' else 502
+
+@app.route('/api/drones/<drone_id>/state/')
+def drone_state(drone_id):
+    latest = get_fleet().get(drone_id).telemetry.latest()
+    if latest is None:
+        return jsonify(status='error', message='no state yet'), 503
+    return jsonify(latest)
+
+@app.route('/api/drones/<drone_id>/video/h264')
+def drone_video_h264(drone_id):
+    session = get_fleet().get(drone_id)
+    return Response(session.h264_hub.subscribe(), mimetype='video/h264',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/drones/<drone_id>/mission/', methods=['GET', 'POST'])
+def drone_mission(drone_id):
+    runner = get_fleet().get(drone_id).mission
+    if request.method == 'GET':
+        return jsonify(runner.status())
+
+    try:
+        mission = request_mission()
+    except ErrorInvalidMission as ex:
+        return jsonify(status='error', message=str(ex)), 400
+    runner.start(mission)
+    return jsonify(runner.status()), 202
+
+@app.route('/api/drones/<drone_id>/mission/stop', methods=['POST'])
+def drone_stop_mission(drone_id):
+    runner = get_fleet().get(drone_id).mission
+    runner.stop()
+    return jsonify(runner.status())
 
 def run():
     app.run(host=config.WEB_ADDRESS, port=config.WEB_PORT, threaded=True)
\ No newline at end of file
@@ -1,3 +1,6 @@
+import time
+
+
 class Singleton(type):
 
     _instances = {}
@@ -6,4 +9,32 @@ class Singleton(type):
         if cls not in cls._instances:
             cls._instances[cls] = super(
                 Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
\ No newline at end of file
+        return cls._instances[cls]
+
+
+# class untuk menghitung laju kejadian per detik dengan rata-rata bergerak
+class RateMeter(object):
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.count = 0
+        self._last = None
+        self._interval = None
+
+    def tick(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self._last is not None:
+            interval = now - self._last
+            if self._interval is None:
+                self._interval = interval
+            else:
+                self._interval += self.alpha * (interval - self._interval)
+        self._last = now
+        self.count += 1
+
+    @property
+    def rate(self):
+        if not self._interval:
+            return 0.0
+        return 1.0 / self._interval
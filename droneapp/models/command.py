@@ -0,0 +1,151 @@
+# import library
+import collections
+from concurrent.futures import Future
+import logging
+import threading
+import time
+
+from droneapp.models.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# batas waktu default menunggu respon drone (detik) dan jumlah pengulangan
+DEFAULT_COMMAND_TIMEOUT = 7.0
+DEFAULT_COMMAND_RETRY = 0
+
+# jumlah maksimal perintah yang boleh mengantri di loop I/O
+COMMAND_QUEUE_SIZE = 16
+
+# jumlah perintah gerak per detik yang masih bisa dilayani drone
+MOTION_COMMAND_RATE = 5.0
+
+# batas waktu dan pengulangan per perintah (timeout, retry)
+# perintah gerak tidak diulang agar drone tidak bergerak dua kali
+COMMAND_POLICIES = {
+    'command': (1.5, 3),
+    'streamon': (1.5, 3),
+    'streamoff': (1.5, 3),
+    'speed': (1.5, 3),
+    'takeoff': (20.0, 0),
+    'land': (20.0, 0),
+    'emergency': (1.5, 3),
+    'flip': (10.0, 0),
+    'go': (10.0, 0),
+}
+
+# hasil dari satu perintah yang dikirim ke drone
+# status: 'ok', 'error', 'timeout' atau 'not_acquire'
+CommandResult = collections.namedtuple(
+    'CommandResult', ['command', 'response', 'status', 'rtt', 'attempts'])
+
+
+# metric jumlah perintah per status dan waktu pulang-pergi perintah
+COMMAND_COUNTERS = {
+    status: REGISTRY.counter('drone_commands',
+                             'Drone commands by result status',
+                             {'status': status})
+    for status in ('ok', 'error', 'timeout', 'not_acquire')}
+COMMAND_RTT = REGISTRY.histogram(
+    'drone_command_rtt_seconds',
+    'Round-trip time of acknowledged drone commands')
+UNMATCHED_RESPONSES = REGISTRY.counter(
+    'drone_unmatched_responses',
+    'Drone responses that arrived with no command waiting')
+
+LATE_RESPONSES = REGISTRY.counter(
+    'drone_late_responses',
+    'Drone responses discarded because their command had timed out')
+
+
+# fungsi untuk mencatat hasil perintah ke metric
+def record_command(result):
+    COMMAND_COUNTERS[result.status].inc()
+    if result.rtt is not None:
+        COMMAND_RTT.observe(result.rtt)
+    return result
+
+
+# fungsi untuk mengambil timeout dan retry sesuai nama perintah
+def command_policy(command):
+    name = command.split(' ', 1)[0]
+    return COMMAND_POLICIES.get(
+        name, (DEFAULT_COMMAND_TIMEOUT, DEFAULT_COMMAND_RETRY))
+
+
+# fungsi untuk membuat future yang sudah selesai
+def completed_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+# class untuk mengirim perintah gerak pelacakan wajah
+# hanya perintah terbaru yang disimpan, perintah lama yang belum terkirim
+# langsung digantikan sehingga drone selalu bereaksi ke frame terbaru
+class MotionChannel(object):
+
+    def __init__(self, send, rate=MOTION_COMMAND_RATE):
+        self._send = send
+        self._interval = 1.0 / rate
+        self._cond = threading.Condition()
+        self._setpoint = None
+        self._stop_event = threading.Event()
+        self.submitted = 0
+        self.superseded = 0
+        self.cleared = 0
+        self.sent = 0
+        self._thread = threading.Thread(target=self._run,
+                                        name='motion_channel', daemon=True)
+        self._thread.start()
+
+    # fungsi untuk mengganti perintah gerak yang menunggu dengan yang terbaru
+    def put(self, command):
+        with self._cond:
+            if self._setpoint is not None:
+                self.superseded += 1
+            self._setpoint = command
+            self.submitted += 1
+            self._cond.notify()
+
+    # fungsi untuk membuang perintah gerak yang belum terkirim
+    def clear(self):
+        with self._cond:
+            if self._setpoint is not None:
+                self.cleared += 1
+            self._setpoint = None
+
+    def stats(self):
+        return {'submitted': self.submitted, 'superseded': self.superseded,
+                'cleared': self.cleared, 'sent': self.sent}
+
+    def _run(self):
+        last_sent = time.monotonic() - self._interval
+        while not self._stop_event.is_set():
+            with self._cond:
+                while self._setpoint is None and not self._stop_event.is_set():
+                    self._cond.wait()
+
+            # batasi kecepatan kirim, perintah baru masih bisa menggantikan
+            delay = last_sent + self._interval - time.monotonic()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+
+            with self._cond:
+                command, self._setpoint = self._setpoint, None
+            if command is None:
+                continue
+
+            last_sent = time.monotonic()
+            self.sent += 1
+            try:
+                self._send(command).result()
+            except Exception as ex:
+                logger.error({'action': 'motion_channel', 'command': command,
+                              'ex': ex})
+
+    # fungsi untuk menghentikan thread pengirim
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout)
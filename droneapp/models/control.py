@@ -0,0 +1,197 @@
+# import library
+import collections
+import logging
+import threading
+import time
+
+from droneapp.models.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# laju loop kendali (Hz)
+DEFAULT_CONTROL_RATE = 20.0
+
+# target tidak diperbarui selama ini (detik) dianggap hilang
+TARGET_TIMEOUT = 0.5
+
+# nilai rc maksimal yang diterima Tello
+RC_LIMIT = 100
+
+# ukuran wajah yang dituju, bagian dari luas frame
+DEFAULT_TARGET_AREA = 0.08
+
+# mode pelacakan: 'rc' memakai loop PID, 'go' memakai perintah go bertahap
+TRACKING_MODE_RC = 'rc'
+TRACKING_MODE_GO = 'go'
+TRACKING_MODES = (TRACKING_MODE_RC, TRACKING_MODE_GO)
+
+# gain dan batas per sumbu, error x dan y dinormalisasi ke -1..1
+# yaw mengikuti posisi horizontal, naik turun mengikuti posisi vertikal,
+# maju mundur mengikuti ukuran wajah
+PidGains = collections.namedtuple(
+    'PidGains', ['kp', 'ki', 'kd', 'deadband', 'limit'])
+DEFAULT_GAINS = {
+    'yaw': PidGains(60.0, 5.0, 8.0, 0.05, 60),
+    'up_down': PidGains(50.0, 5.0, 5.0, 0.08, 40),
+    'forward_back': PidGains(250.0, 20.0, 0.0, 0.015, 30),
+}
+
+# kesalahan posisi wajah terhadap tengah frame dan ukuran target
+# timestamp adalah waktu tangkap frame asal error
+FaceError = collections.namedtuple(
+    'FaceError', ['x', 'y', 'size', 'timestamp'])
+
+CONTROL_JITTER = REGISTRY.histogram(
+    'control_period_jitter_seconds',
+    'Deviation of the control loop period from its target',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+CONTROL_LATENCY = REGISTRY.histogram(
+    'control_command_latency_seconds',
+    'Time from frame capture to the rc command that reacts to it')
+RC_COMMANDS = REGISTRY.counter('control_rc_commands',
+                               'rc commands sent by the control loop')
+
+
+# fungsi untuk membatasi nilai di antara -limit dan limit
+def clamp(value, limit):
+    return max(-limit, min(limit, value))
+
+
+# class pengendali PID untuk satu sumbu
+# error di dalam deadband dianggap nol, integral dibatasi agar tidak
+# menumpuk saat output sudah mentok di limit
+class PID(object):
+
+    def __init__(self, gains):
+        self.gains = gains
+        self.reset()
+
+    def reset(self):
+        self._integral = 0.0
+        self._prev_error = None
+
+    def update(self, error, dt):
+        gains = self.gains
+        if abs(error) < gains.deadband:
+            error = 0.0
+        if gains.ki:
+            self._integral = clamp(self._integral + error * dt,
+                                   gains.limit / gains.ki)
+        derivative = 0.0
+        if self._prev_error is not None and dt > 0:
+            derivative = (error - self._prev_error) / dt
+        self._prev_error = error
+        output = (gains.kp * error + gains.ki * self._integral +
+                  gains.kd * derivative)
+        return int(round(clamp(output, min(gains.limit, RC_LIMIT))))
+
+
+# class loop kendali pelacakan wajah dengan laju tetap
+# thread video hanya menaruh error terbaru, loop ini mengubahnya menjadi
+# perintah rc tanpa menunggu balasan drone
+class FaceController(object):
+
+    def __init__(self, send_rc, rate=DEFAULT_CONTROL_RATE, gains=None,
+                 target_timeout=TARGET_TIMEOUT):
+        self._send_rc = send_rc
+        self.period = 1.0 / rate
+        self.target_timeout = target_timeout
+        gains = dict(DEFAULT_GAINS, **(gains or {}))
+        self._pids = {axis: PID(gains[axis]) for axis in DEFAULT_GAINS}
+        self._cond = threading.Condition()
+        self._error = None
+        self._is_moving = False
+        self._stop_event = threading.Event()
+        self.last_rc = (0, 0, 0, 0)
+        self.jitter = 0.0
+        self.latency = 0.0
+        self.ticks = 0
+        self._thread = threading.Thread(target=self._run,
+                                        name='face_controller', daemon=True)
+        self._thread.start()
+
+    # fungsi untuk menaruh error terbaru dari frame video
+    def set_error(self, error):
+        with self._cond:
+            self._error = error
+            self._cond.notify()
+
+    # fungsi untuk menghapus target, drone akan diam di tempat
+    def clear(self):
+        with self._cond:
+            self._error = None
+            self._cond.notify()
+
+    def stats(self):
+        return {'control_hz': 1.0 / self.period, 'control_ticks': self.ticks,
+                'control_jitter_ms': self.jitter * 1000,
+                'control_latency_ms': self.latency * 1000,
+                'last_rc': self.last_rc}
+
+    def _run(self):
+        next_tick = None
+        while not self._stop_event.is_set():
+            # tanpa target dan drone sudah diam, thread tidur sampai ada target
+            with self._cond:
+                while (self._error is None and not self._is_moving
+                       and not self._stop_event.is_set()):
+                    next_tick = None
+                    self._cond.wait()
+                error = self._error
+
+            now = time.monotonic()
+            if next_tick is None:
+                next_tick = now
+            else:
+                # jitter: selisih waktu bangun dari jadwal
+                self.jitter = now - next_tick
+                CONTROL_JITTER.observe(abs(self.jitter))
+            self._tick(error)
+            self.ticks += 1
+
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # terlambat lebih dari satu periode, jadwal dimulai ulang
+                next_tick = time.monotonic()
+                continue
+            if self._stop_event.wait(delay):
+                break
+
+    def _tick(self, error):
+        # target yang tidak diperbarui dianggap hilang
+        if (error is not None
+                and time.time() - error.timestamp > self.target_timeout):
+            with self._cond:
+                if self._error is error:
+                    self._error = None
+            error = None
+        if error is None:
+            for pid in self._pids.values():
+                pid.reset()
+            rc = (0, 0, 0, 0)
+        else:
+            dt = self.period
+            yaw = self._pids['yaw'].update(error.x, dt)
+            up_down = self._pids['up_down'].update(error.y, dt)
+            forward_back = self._pids['forward_back'].update(error.size, dt)
+            rc = (0, forward_back, up_down, yaw)
+
+        self._is_moving = rc != (0, 0, 0, 0)
+        try:
+            self._send_rc(*rc)
+        except OSError as ex:
+            logger.error({'action': 'face_controller', 'ex': ex})
+            return
+        self.last_rc = rc
+        RC_COMMANDS.inc()
+        if error is not None:
+            self.latency = time.time() - error.timestamp
+            CONTROL_LATENCY.observe(self.latency)
+
+    # fungsi untuk menghentikan loop kendali
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout)
@@ -0,0 +1,535 @@
+# import library
+import collections
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+from droneapp.models.base import RateMeter
+from droneapp.models.tracking import iou_matrix
+from droneapp.models.video import frame_age_histogram
+from droneapp.models.video import stage_histogram
+
+logger = logging.getLogger(__name__)
+
+# berapa kali per detik deteksi wajah dijalankan
+DEFAULT_DETECT_RATE = 10.0
+
+# jumlah proses deteksi jika deteksi dijalankan di proses terpisah
+DEFAULT_DETECT_WORKERS = 2
+
+# parameter haar cascade
+DEFAULT_SCALE_FACTOR = 1.3
+DEFAULT_MIN_NEIGHBORS = 5
+
+# mode deteksi: 'full' selalu seluruh frame, 'adaptive' mencari dulu di
+# sekitar setiap wajah yang sedang dilacak dan baru mencari seluruh frame
+# jika ada wajah yang tidak ditemukan
+DETECT_MODE_FULL = 'full'
+DETECT_MODE_ADAPTIVE = 'adaptive'
+DETECT_MODES = (DETECT_MODE_FULL, DETECT_MODE_ADAPTIVE)
+
+# perluasan area pencarian di sekitar wajah terakhir (kali ukuran wajah)
+ROI_MARGIN = 0.75
+
+# wajah dari dua area pencarian yang bertumpuk dianggap wajah yang sama
+ROI_DUPLICATE_IOU = 0.5
+
+# batas ukuran wajah yang dicari relatif ke ukuran wajah terakhir
+ROI_MIN_SCALE = 0.7
+ROI_MAX_SCALE = 1.5
+
+# skala frame untuk pencarian seluruh frame, 1.0 berarti tanpa diperkecil
+FULL_SEARCH_SCALE = 1.0
+
+# pencarian seluruh frame tetap dilakukan setiap sekian deteksi
+# agar wajah baru di luar area pencarian tetap ditemukan
+FULL_SEARCH_INTERVAL = 10
+
+# ukuran frame kecil untuk mendeteksi gerakan (lebar, tinggi)
+MOTION_GATE_SIZE = (80, 60)
+
+# selisih intensitas piksel yang dianggap berubah
+MOTION_PIXEL_THRESHOLD = 25
+
+# bagian piksel yang harus berubah agar deteksi wajah dijalankan
+MOTION_AREA_THRESHOLD = 0.02
+
+# deteksi tetap dijalankan setiap sekian detik walau tidak ada gerakan
+MOTION_FALLBACK_INTERVAL = 2.0
+
+DETECT_SECONDS = stage_histogram('detect')
+DETECTED_AGE = frame_age_histogram('detected')
+
+# hasil deteksi wajah untuk satu frame
+# latency adalah waktu dari frame ditangkap sampai hasil deteksi tersedia
+# eyes berisi daftar mata per wajah, relatif terhadap kotak wajah
+# gray adalah bidang abu-abu frame yang dideteksi, kotak wajah berada di
+# posisi frame itu dan harus digeser dulu ke frame sekarang
+DetectionResult = collections.namedtuple(
+    'DetectionResult',
+    ['faces', 'seq', 'timestamp', 'detect_time', 'latency', 'eyes', 'gray'])
+
+
+# fungsi untuk menggabungkan wajah dari beberapa area pencarian
+# wajah yang sama dari area yang bertumpuk hanya diambil sekali
+def _merge_faces(found):
+    faces = []
+    for face in np.concatenate([np.asarray(f).reshape(-1, 4)
+                                for f in found]):
+        if faces and iou_matrix([face], faces).max() >= ROI_DUPLICATE_IOU:
+            continue
+        faces.append(face)
+    return np.asarray(faces, np.int32)
+
+
+# class untuk menjalankan haar cascade di seluruh frame atau di sekitar wajah
+# tidak menyimpan state sehingga bisa dipakai di thread maupun proses lain
+class CascadeSearch(object):
+
+    def __init__(self, cascade, scale_factor=DEFAULT_SCALE_FACTOR,
+                 min_neighbors=DEFAULT_MIN_NEIGHBORS,
+                 full_search_scale=FULL_SEARCH_SCALE, eye_cascade=None):
+        self._cascade = cascade
+        self._eye_cascade = eye_cascade
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.full_search_scale = full_search_scale
+
+    # fungsi untuk mencari wajah, mulai dari sekitar setiap kotak hint
+    # seluruh frame dicari jika salah satu hint tidak menemukan wajah
+    # mengembalikan (faces, is_roi_hit)
+    def search(self, gray, hint=None):
+        if hint:
+            found = [self.search_roi(gray, box) for box in hint]
+            if all(len(faces) for faces in found):
+                return _merge_faces(found), True
+        return self.search_full(gray), False
+
+    def search_roi(self, gray, face):
+        x, y, w, h = face
+        height, width = gray.shape[:2]
+        left = max(int(x - w * ROI_MARGIN), 0)
+        top = max(int(y - h * ROI_MARGIN), 0)
+        right = min(int(x + w * (1 + ROI_MARGIN)), width)
+        bottom = min(int(y + h * (1 + ROI_MARGIN)), height)
+
+        faces = self._cascade.detectMultiScale(
+            gray[top:bottom, left:right], self.scale_factor,
+            self.min_neighbors,
+            minSize=(int(w * ROI_MIN_SCALE), int(h * ROI_MIN_SCALE)),
+            maxSize=(int(w * ROI_MAX_SCALE), int(h * ROI_MAX_SCALE)))
+        if not len(faces):
+            return faces
+        return np.asarray(faces) + np.array([left, top, 0, 0])
+
+    def search_full(self, gray):
+        scale = self.full_search_scale
+        if scale == 1.0:
+            return self._cascade.detectMultiScale(
+                gray, self.scale_factor, self.min_neighbors)
+
+        small = cv.resize(gray, None, fx=scale, fy=scale,
+                          interpolation=cv.INTER_AREA)
+        faces = self._cascade.detectMultiScale(
+            small, self.scale_factor, self.min_neighbors)
+        if not len(faces):
+            return faces
+        return (np.asarray(faces) / scale).astype(np.int32)
+
+    # fungsi untuk mencari mata di dalam setiap wajah
+    # koordinat mata relatif terhadap kotak wajahnya
+    def search_eyes(self, gray, faces):
+        if self._eye_cascade is None:
+            return ()
+        eyes = []
+        for (x, y, w, h) in faces:
+            found = self._eye_cascade.detectMultiScale(gray[y:y+h, x:x+w])
+            eyes.append([tuple(int(v) for v in eye) for eye in found])
+        return eyes
+
+
+# class dasar detektor wajah, mengatur laju, mode dan statistik
+class BaseFaceDetector(object):
+
+    def __init__(self, rate=DEFAULT_DETECT_RATE, mode=DETECT_MODE_ADAPTIVE):
+        self._interval = 1.0 / rate
+        self.set_mode(mode)
+        self._since_full_search = 0
+        self.roi_searches = 0
+        self.roi_hits = 0
+        self.full_searches = 0
+
+        self.meter = RateMeter()
+        self.detect_time = 0.0
+        self.detect_time_total = 0.0
+        self.latency = 0.0
+
+    # fungsi untuk mengatur berapa kali per detik deteksi dijalankan
+    def set_rate(self, rate):
+        self._interval = 1.0 / rate
+
+    # fungsi untuk memilih mode deteksi 'full' atau 'adaptive'
+    def set_mode(self, mode):
+        if mode not in DETECT_MODES:
+            raise ValueError(f'unknown detect mode {mode}')
+        self.mode = mode
+
+    # fungsi untuk memilih area pencarian berikutnya dari kotak track
+    # None berarti mencari di seluruh frame
+    def _next_hint(self, boxes):
+        self._since_full_search += 1
+        if (self.mode != DETECT_MODE_ADAPTIVE or not boxes
+                or self._since_full_search >= FULL_SEARCH_INTERVAL):
+            return None
+        return [tuple(int(v) for v in box) for box in boxes]
+
+    # fungsi untuk mencatat hasil deteksi
+    def _record(self, faces, hint, is_roi_hit, detect_time, latency):
+        if hint is not None:
+            self.roi_searches += 1
+        if is_roi_hit:
+            self.roi_hits += 1
+        else:
+            self.full_searches += 1
+            self._since_full_search = 0
+
+        self.meter.tick()
+        self.detect_time = detect_time
+        self.detect_time_total += detect_time
+        self.latency = latency
+        DETECT_SECONDS.observe(detect_time)
+        DETECTED_AGE.observe(latency)
+
+    def stats(self):
+        average = self.detect_time_total / max(self.meter.count, 1)
+        return {'detect_fps': self.meter.rate,
+                'detect_ms': self.detect_time * 1000,
+                'detect_avg_ms': average * 1000,
+                'detections': self.meter.count,
+                'latency_ms': self.latency * 1000,
+                'mode': self.mode,
+                'roi_searches': self.roi_searches,
+                'roi_hits': self.roi_hits,
+                'full_searches': self.full_searches}
+
+
+# class untuk menjalankan deteksi wajah di thread tersendiri
+# hanya frame terbaru yang dideteksi sehingga streaming tidak ikut melambat
+class FaceDetector(BaseFaceDetector):
+
+    def __init__(self, cascade, rate=DEFAULT_DETECT_RATE,
+                 scale_factor=DEFAULT_SCALE_FACTOR,
+                 min_neighbors=DEFAULT_MIN_NEIGHBORS,
+                 mode=DETECT_MODE_ADAPTIVE,
+                 full_search_scale=FULL_SEARCH_SCALE, eye_cascade=None):
+        super(FaceDetector, self).__init__(rate=rate, mode=mode)
+        self._search = CascadeSearch(cascade, scale_factor, min_neighbors,
+                                     full_search_scale, eye_cascade)
+
+        self._cond = threading.Condition()
+        self._request = None
+        self._result = None
+        self._stop_event = threading.Event()
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='face_detector', daemon=True)
+        self._thread.start()
+
+    # fungsi untuk mengirim frame grayscale terbaru ke detektor
+    # gray tidak boleh diubah lagi oleh pemanggil setelah dikirim
+    # boxes adalah kotak wajah yang sedang dilacak untuk mode adaptive
+    def submit(self, gray, seq, timestamp, boxes=()):
+        with self._cond:
+            self._request = (gray, seq, timestamp, boxes)
+            self._cond.notify()
+
+    # fungsi untuk mengambil hasil deteksi baru, None jika belum ada
+    def poll(self):
+        with self._cond:
+            result, self._result = self._result, None
+        return result
+
+    def _run(self):
+        last_detect = time.monotonic() - self._interval
+        while not self._stop_event.is_set():
+            with self._cond:
+                while self._request is None and not self._stop_event.is_set():
+                    self._cond.wait()
+
+            # batasi laju deteksi, frame baru masih bisa menggantikan
+            delay = last_detect + self._interval - time.monotonic()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+
+            with self._cond:
+                request, self._request = self._request, None
+            if request is None:
+                continue
+            gray, seq, timestamp, boxes = request
+
+            last_detect = time.monotonic()
+            hint = self._next_hint(boxes)
+            try:
+                faces, is_roi_hit = self._search.search(gray, hint)
+                eyes = self._search.search_eyes(gray, faces)
+            except Exception as ex:
+                logger.error({'action': 'face_detector', 'ex': ex})
+                continue
+            detect_time = time.monotonic() - last_detect
+            latency = time.time() - timestamp
+
+            self._record(faces, hint, is_roi_hit, detect_time, latency)
+            with self._cond:
+                self._result = DetectionResult(
+                    faces, seq, timestamp, detect_time, latency, eyes, gray)
+
+    # fungsi untuk menghentikan thread detektor
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout)
+
+
+# class untuk menyaring frame sebelum deteksi wajah
+# deteksi hanya dijalankan jika cukup banyak piksel berubah dibanding
+# frame sebelumnya atau jika sudah lama tidak ada deteksi
+class MotionGate(object):
+
+    def __init__(self, size=MOTION_GATE_SIZE,
+                 pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                 area_threshold=MOTION_AREA_THRESHOLD,
+                 fallback_interval=MOTION_FALLBACK_INTERVAL):
+        width, height = size
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.fallback_interval = fallback_interval
+        self._small = np.empty((height, width), np.uint8)
+        self._prev = np.empty((height, width), np.uint8)
+        self._diff = np.empty((height, width), np.uint8)
+        self._has_prev = False
+        self._last_trigger = None
+        self.checked = 0
+        self.triggered = 0
+        self.skipped = 0
+
+    # fungsi untuk mengecek apakah frame ini perlu dideteksi
+    def check(self, gray, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.checked += 1
+        cv.resize(gray, self.size, dst=self._small,
+                  interpolation=cv.INTER_AREA)
+
+        is_motion = True
+        if self._has_prev:
+            cv.absdiff(self._small, self._prev, dst=self._diff)
+            cv.threshold(self._diff, self.pixel_threshold, 255,
+                         cv.THRESH_BINARY, dst=self._diff)
+            changed = cv.countNonZero(self._diff) / self._diff.size
+            is_motion = changed >= self.area_threshold
+        self._small, self._prev = self._prev, self._small
+        self._has_prev = True
+
+        is_fallback = (self._last_trigger is None or
+                       now - self._last_trigger >= self.fallback_interval)
+        if is_motion or is_fallback:
+            self.triggered += 1
+            self._last_trigger = now
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {'gate_checked': self.checked,
+                'gate_triggered': self.triggered,
+                'gate_skipped': self.skipped}
+
+
+# class untuk membuat bidang abu-abu kecil dari frame penuh untuk deteksi
+# dan memetakan kotak hasil deteksi kembali ke ukuran frame penuh
+class DetectionPlane(object):
+
+    def __init__(self, frame_size, detect_size):
+        width, height = detect_size
+        self.frame_size = frame_size
+        self.size = detect_size
+        self.scale_x = frame_size[0] / width
+        self.scale_y = frame_size[1] / height
+        self.is_scaled = frame_size != detect_size
+        self._small = np.empty((height, width, 3), np.uint8)
+
+    # fungsi untuk membuat bidang abu-abu dari frame BGR penuh
+    # hasilnya array baru karena detektor dan tracker menyimpannya
+    def make(self, image):
+        if self.is_scaled:
+            image = cv.resize(image, self.size, dst=self._small,
+                              interpolation=cv.INTER_AREA)
+        return cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+
+    # fungsi untuk memetakan kotak (x, y, w, h) ke koordinat frame penuh
+    def to_frame(self, boxes):
+        if not self.is_scaled:
+            return [tuple(int(v) for v in box) for box in boxes]
+        return [(int(x * self.scale_x), int(y * self.scale_y),
+                 int(w * self.scale_x), int(h * self.scale_y))
+                for (x, y, w, h) in boxes]
+
+
+# fungsi yang dijalankan di setiap proses deteksi
+# frame dibaca langsung dari shared memory tanpa pickling
+def _detection_worker(shm_name, shape, slots, face_xml_file, eye_xml_file,
+                      scale_factor, min_neighbors, full_search_scale,
+                      task_queue, result_queue):
+    cv.setNumThreads(1)
+    eye_cascade = None
+    if eye_xml_file:
+        eye_cascade = cv.CascadeClassifier(eye_xml_file)
+    search = CascadeSearch(cv.CascadeClassifier(face_xml_file), scale_factor,
+                           min_neighbors, full_search_scale, eye_cascade)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        _run_detection_worker(shm, shape, slots, search,
+                              task_queue, result_queue)
+    finally:
+        shm.close()
+
+
+def _run_detection_worker(shm, shape, slots, search, task_queue, result_queue):
+    frames = np.ndarray((slots, ) + tuple(shape), np.uint8, buffer=shm.buf)
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        slot, seq, timestamp, hint = task
+
+        started = time.monotonic()
+        try:
+            faces, is_roi_hit = search.search(frames[slot], hint)
+            eyes = search.search_eyes(frames[slot], faces)
+            faces = [tuple(int(v) for v in face) for face in faces]
+        except Exception as ex:
+            logger.error({'action': 'detection_worker', 'ex': ex})
+            faces, is_roi_hit, eyes = [], False, ()
+        detect_time = time.monotonic() - started
+        result_queue.put((slot, seq, timestamp, hint, faces, is_roi_hit,
+                          eyes, detect_time))
+
+
+# class untuk menjalankan deteksi wajah di beberapa proses
+# decoder menulis frame grayscale ke shared memory, proses deteksi hanya
+# menerima nomor slot dan mengembalikan hasil bertanda nomor frame
+class DetectionPool(BaseFaceDetector):
+
+    def __init__(self, face_xml_file, shape, workers=DEFAULT_DETECT_WORKERS,
+                 rate=DEFAULT_DETECT_RATE,
+                 scale_factor=DEFAULT_SCALE_FACTOR,
+                 min_neighbors=DEFAULT_MIN_NEIGHBORS,
+                 mode=DETECT_MODE_ADAPTIVE,
+                 full_search_scale=FULL_SEARCH_SCALE, eye_xml_file=None):
+        super(DetectionPool, self).__init__(rate=rate, mode=mode)
+        self._shape = tuple(shape)
+
+        # satu slot per proses, frame baru hanya dikirim ke proses yang bebas
+        slots = workers
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=slots * int(np.prod(self._shape)))
+        self._frames = np.ndarray((slots, ) + self._shape, np.uint8,
+                                  buffer=self._shm.buf)
+        self._free_slots = collections.deque(range(slots))
+        # bidang abu-abu per slot tetap di proses ini untuk DetectionResult
+        self._grays = [None] * slots
+        self._lock = threading.Lock()
+        self._result = None
+        self._last_seq = 0
+        self._last_submit = time.monotonic() - self._interval
+        self.dropped = 0
+
+        context = multiprocessing.get_context('spawn')
+        self._task_queue = context.Queue()
+        self._result_queue = context.Queue()
+        self._processes = []
+        for i in range(workers):
+            process = context.Process(
+                target=_detection_worker,
+                args=(self._shm.name, self._shape, slots, face_xml_file,
+                      eye_xml_file, scale_factor, min_neighbors,
+                      full_search_scale, self._task_queue,
+                      self._result_queue),
+                name=f'face_detector_{i}', daemon=True)
+            process.start()
+            self._processes.append(process)
+
+        self._collector = threading.Thread(target=self._collect,
+                                           name='detection_collector',
+                                           daemon=True)
+        self._collector.start()
+
+    # fungsi untuk mengirim frame grayscale terbaru ke proses yang bebas
+    # frame dibuang jika semua proses masih sibuk
+    def submit(self, gray, seq, timestamp, boxes=()):
+        now = time.monotonic()
+        if now - self._last_submit < self._interval:
+            return
+        with self._lock:
+            if not self._free_slots:
+                self.dropped += 1
+                return
+            slot = self._free_slots.popleft()
+            hint = self._next_hint(boxes)
+        self._grays[slot] = gray
+        np.copyto(self._frames[slot], gray)
+        self._last_submit = now
+        self._task_queue.put((slot, seq, timestamp, hint))
+
+    # fungsi untuk mengambil hasil deteksi baru, None jika belum ada
+    def poll(self):
+        with self._lock:
+            result, self._result = self._result, None
+        return result
+
+    def _collect(self):
+        while True:
+            item = self._result_queue.get()
+            if item is None:
+                break
+            (slot, seq, timestamp, hint, faces, is_roi_hit,
+             eyes, detect_time) = item
+            latency = time.time() - timestamp
+            with self._lock:
+                gray, self._grays[slot] = self._grays[slot], None
+                self._free_slots.append(slot)
+                # hasil dari frame yang lebih lama dari hasil terakhir dibuang
+                if seq < self._last_seq:
+                    continue
+                self._last_seq = seq
+                self._record(faces, hint, is_roi_hit, detect_time, latency)
+                self._result = DetectionResult(
+                    faces, seq, timestamp, detect_time, latency, eyes, gray)
+
+    def stats(self):
+        stats = super(DetectionPool, self).stats()
+        stats.update({'workers': len(self._processes),
+                      'dropped': self.dropped})
+        return stats
+
+    # fungsi untuk menghentikan semua proses dan melepas shared memory
+    def stop(self, timeout=None):
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._result_queue.put(None)
+        self._collector.join(timeout)
+        del self._frames
+        self._shm.close()
+        self._shm.unlink()
@@ -1,17 +1,48 @@
 # import library
+import collections
 import logging
-import contextlib
 import os
-import socket
-import subprocess
 import sys
 import threading
 import time
 
 import cv2 as cv
-import numpy as np
 
+from droneapp.models.base import RateMeter
 from droneapp.models.base import Singleton
+from droneapp.models.command import MotionChannel
+from droneapp.models.control import DEFAULT_TARGET_AREA
+from droneapp.models.control import FaceController
+from droneapp.models.control import FaceError
+from droneapp.models.control import TRACKING_MODE_RC
+from droneapp.models.control import TRACKING_MODES
+from droneapp.models.detection import DEFAULT_DETECT_RATE
+from droneapp.models.detection import DETECT_MODE_ADAPTIVE
+from droneapp.models.detection import DetectionPlane
+from droneapp.models.detection import DetectionPool
+from droneapp.models.detection import FaceDetector
+from droneapp.models.detection import MotionGate
+from droneapp.models.h264 import ACCESS_UNIT_DELIMITER
+from droneapp.models.h264 import AccessUnitAssembler
+from droneapp.models.h264 import AccessUnitHub
+from droneapp.models.metrics import REGISTRY
+from droneapp.models.mission import Mission
+from droneapp.models.mission import MissionRunner
+from droneapp.models.mission import parse_mission
+from droneapp.models.mission import PATROL_MISSION
+from droneapp.models.telemetry import TelemetryRing
+from droneapp.models.tracking import FaceTracks
+from droneapp.models.tracking import FlowTracker
+from droneapp.models.tracking import TARGET_POLICY_LARGEST
+from droneapp.models.transport import DECODER_BACKLOG_LIMIT
+from droneapp.models.transport import DroneIO
+from droneapp.models.video import DELIVERY_TIERS
+from droneapp.models.video import EncodedFrame
+from droneapp.models.video import FrameHub
+from droneapp.models.video import FrameRing
+from droneapp.models.video import frame_age_histogram
+from droneapp.models.video import stage_histogram
+from droneapp.models.video import TierCache
 
 # membuat log data
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
@@ -26,24 +57,52 @@ DEFAULT_SPEED = 35
 # kecepatan derajat putaran
 DEFAULT_DEGREE = 10
 
-# Ukuran frame video streaming
-FRAME_X = int(960/3)
-FRAME_Y = int(720/3)
-FRAME_AREA = FRAME_X * FRAME_Y
+# jarak gerak yang diterima Tello (cm)
+MIN_MOVE_CM = 20
+MAX_MOVE_CM = 500
 
-FRAME_SIZE = FRAME_AREA * 3
-FRAME_CENTER_X = FRAME_X / 2
-FRAME_CENTER_Y = FRAME_Y / 2
+# Ukuran frame penuh hasil decode untuk penonton
+FRAME_X = 960
+FRAME_Y = 720
 
-CMD_FFMPEG = (f'ffmpeg -hwaccel auto -hwaccel_device opencl -i pipe:0 '
-              f'-pix_fmt bgr24 -s {FRAME_X}x{FRAME_Y} -f rawvideo pipe:1')
+# Ukuran bidang abu-abu kecil untuk deteksi wajah dan pelacakan
+DETECT_X = int(960/3)
+DETECT_Y = int(720/3)
+
+# decode tetap berjalan selama ini (detik) setelah snapshot terakhir diminta
+SNAPSHOT_KEEPALIVE = 30.0
+
+# buffer socket video 1 MB agar burst frame IDR tidak dibuang kernel
+VIDEO_RECV_BUFFER = 1 << 20
+
+# metric pipeline video
+VIDEO_DATAGRAMS = REGISTRY.counter(
+    'video_datagrams', 'Video datagrams received from the drone')
+VIDEO_BYTES = REGISTRY.counter(
+    'video_bytes', 'Video bytes received from the drone')
+PIPE_WRITE_SECONDS = stage_histogram('pipe_write')
+DECODE_SECONDS = stage_histogram('decode')
+TRACK_SECONDS = stage_histogram('track')
+ENCODE_SECONDS = stage_histogram('encode')
+DECODED_AGE = frame_age_histogram('decoded')
+ENCODED_AGE = frame_age_histogram('encoded')
+
+# batas frame yang menunggu keluar dari ffmpeg
+DECODE_QUEUE_SIZE = 120
+
+CMD_FFMPEG = ('ffmpeg -hwaccel auto -hwaccel_device opencl -i pipe:0 '
+              '-pix_fmt bgr24 -s {width}x{height} -f rawvideo pipe:1')
 
 # Membuat jalur xml file
 FACE_DETECT_XML_FILE = './droneapp/models/haarcascade_frontalface_default.xml'
+EYE_DETECT_XML_FILE = './droneapp/models/haarcascade_eye.xml'
 
 class ErrorNoFaceDetectXMLFile(Exception):
     """Error No Face Detect XML File"""
 
+class ErrorNoEyeDetectXMLFile(Exception):
+    """Error No Eye Detect XML File"""
+
 # class untuk mengatur drone
 class DroneManager(metaclass=Singleton):
     # koneksi UDP untuk mengirim perintah dan menerima respon
@@ -51,7 +110,14 @@ class DroneManager(metaclass=Singleton):
     # host_ip='192.168.10.2' host_port=8889 untuk drone
     def __init__(self, host_ip='192.168.10.2', host_port=8889,
                  drone_ip='192.168.10.1', drone_port=8889,
-                 is_imperial=False, speed=DEFAULT_SPEED):
+                 video_port=11111, state_port=8890, is_imperial=False, speed=DEFAULT_SPEED,
+                 detect_rate=DEFAULT_DETECT_RATE,
+                 detect_mode=DETECT_MODE_ADAPTIVE,
+                 detect_workers=0, detect_eyes=False,
+                 video_recv_buffer=VIDEO_RECV_BUFFER, decode_on_demand=True,
+                 frame_size=(FRAME_X, FRAME_Y), detect_size=(DETECT_X, DETECT_Y),
+                 tracking_mode=TRACKING_MODE_RC,
+                 target_policy=TARGET_POLICY_LARGEST):
 
         # set inisiasi dengan informasi komputer dan drone
         self.host_ip = host_ip
@@ -59,8 +125,11 @@ class DroneManager(metaclass=Singleton):
         self.drone_ip = drone_ip
         self.drone_port = drone_port
         self.drone_address = (drone_ip, drone_port)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((self.host_ip, self.host_port))
+
+        # semua I/O drone (perintah, status, video dan pipe ke ffmpeg)
+        # dilayani satu event loop asyncio di thread drone_io
+        self._io = DroneIO(self.drone_address)
+        self._io.open_command((self.host_ip, self.host_port))
 
         # mengatur satuan imperial
         self.is_imperial = is_imperial
@@ -68,62 +137,212 @@ class DroneManager(metaclass=Singleton):
         # inisiasi kecepatan
         self.speed = speed
 
-        # set instance untuk drone mengirim respon
-        self.response = None
         self.stop_event = threading.Event()
-        self._response_thread = threading.Thread(
-            target=self.receive_response,
-            args=(self.stop_event, ))
-        self._response_thread.start()
 
-        # set instance untuk drone melakukan patroli
-        self.patrol_event = None
-        self.is_patrol = False
-        self._patrol_semaphore = threading.Semaphore(1)
-        self._thread_patrol = None
+        # status drone dari port 8890 disimpan di ring buffer sehingga
+        # baterai, ketinggian dan lainnya tidak perlu ditanya lewat perintah
+        self.state_port = state_port
+        self._telemetry = TelemetryRing()
+        try:
+            self._io.open_udp('state', (self.host_ip, self.state_port),
+                              self._telemetry.write)
+        except OSError as ex:
+            logger.error({'action': 'receive_state', 'ex': ex})
+
+        # misi (termasuk patroli) dijalankan langkah demi langkah sesuai
+        # jawaban drone, sebagai coroutine di loop I/O
+        self._mission_runner = MissionRunner(self._io.command, self.send_rc,
+                                             self._io.io_loop)
 
         # set instance untuk frame video drone
-        self.proc = subprocess.Popen(CMD_FFMPEG.split(' '),
-                                     stdin=subprocess.PIPE,
-                                     stdout=subprocess.PIPE)
-        self.proc_stdin = self.proc.stdin
-        self.proc_stdout = self.proc.stdout
-
-        self.video_port = 11111
-
-        self._receive_video_thread = threading.Thread(
-            target=self.receive_video,
-            args=(self.stop_event, self.proc_stdin,
-                  self.host_ip, self.video_port,))
-        self._receive_video_thread.start()
+        # ffmpeg men-decode frame penuh untuk penonton, bidang kecil untuk
+        # deteksi dibuat dari frame yang sama sehingga selalu sinkron
+        self.frame_size = tuple(frame_size)
+        self.detect_size = tuple(detect_size)
+        frame_x, frame_y = self.frame_size
+        command = CMD_FFMPEG.format(width=frame_x, height=frame_y)
+        # stdin ffmpeg ditulis loop I/O tanpa blocking, stdout dibaca
+        # langsung ke ring buffer oleh thread decode
+        read_fd, write_fd = os.pipe()
+        self.proc = self._io.start_decoder(command.split(' '), write_fd)
+        os.close(write_fd)
+        self.proc_stdout = os.fdopen(read_fd, 'rb', buffering=0)
+        self._frame_ring = FrameRing((frame_y, frame_x, 3))
+        self._detection_plane = DetectionPlane(self.frame_size,
+                                               self.detect_size)
+        # hasil encode tingkat kualitas lain, dipakai bersama penonton
+        self._tier_cache = TierCache(self._frame_ring)
+
+        self.video_port = video_port
+        self.video_recv_buffer = video_recv_buffer
+
+        # datagram video disusun menjadi frame utuh sebelum ke ffmpeg
+        self._video_assembler = AccessUnitAssembler()
+
+        # frame H.264 asli diteruskan ke penonton /video/h264 tanpa decode
+        # jika decode_on_demand, ffmpeg hanya diberi data saat ada penonton
+        # MJPEG atau deteksi wajah aktif, dimulai lagi dari IDR berikutnya
+        self._h264_hub = AccessUnitHub()
+        self._video_hub = FrameHub()
+        self._is_enable_face_detect = False
+        self.decode_on_demand = decode_on_demand
+        self.is_decoding = not decode_on_demand
+        # waktu terima dan waktu tulis setiap frame yang masuk ke ffmpeg,
+        # dicocokkan dengan frame keluaran sesuai urutan (FIFO)
+        self._decode_queue = collections.deque(maxlen=DECODE_QUEUE_SIZE)
+        self._snapshot_requested_at = None
+        self._io.open_udp('video', (self.host_ip, self.video_port),
+                          self._on_video, recv_buffer=self.video_recv_buffer,
+                          reuse_address=True)
 
         # jika tidak ada file XML
         if not os.path.exists(FACE_DETECT_XML_FILE):
             raise ErrorNoFaceDetectXMLFile(f'No {FACE_DETECT_XML_FILE}')
         self.face_cascade = cv.CascadeClassifier(FACE_DETECT_XML_FILE)
-        self._is_enable_face_detect = False
 
-        # menyimpan respon drone ke thread
-        self._command_semaphore = threading.Semaphore(1)
-        self._command_thread = None
+        # deteksi mata di dalam wajah bersifat opsional
+        eye_xml_file = None
+        if detect_eyes:
+            if not os.path.exists(EYE_DETECT_XML_FILE):
+                raise ErrorNoEyeDetectXMLFile(f'No {EYE_DETECT_XML_FILE}')
+            eye_xml_file = EYE_DETECT_XML_FILE
+
+        # deteksi wajah berjalan di thread sendiri atau di beberapa proses
+        # jika detect_workers > 0, di antara dua deteksi kotak wajah
+        # digeser dengan optical flow
+        if detect_workers:
+            self._face_detector = DetectionPool(
+                FACE_DETECT_XML_FILE, self.detect_size[::-1],
+                workers=detect_workers, rate=detect_rate, mode=detect_mode,
+                eye_xml_file=eye_xml_file)
+        else:
+            eye_cascade = None
+            if eye_xml_file:
+                eye_cascade = cv.CascadeClassifier(eye_xml_file)
+            self._face_detector = FaceDetector(
+                self.face_cascade, rate=detect_rate, mode=detect_mode,
+                eye_cascade=eye_cascade)
+        self._face_eyes = ()
+        self._face_tracker = FlowTracker()
+
+        # ID tetap per wajah dan pemilihan wajah yang diikuti drone
+        self._face_tracks = FaceTracks(self.detect_size, policy=target_policy)
+
+        # saat belum ada wajah, deteksi hanya dijalankan jika ada gerakan
+        self._motion_gate = MotionGate()
+
+        # satu thread decode, deteksi dan encode untuk semua penonton
+        self._decode_meter = RateMeter()
+        self.encode_time = 0.0
+        self._video_producer_thread = threading.Thread(
+            target=self._video_producer,
+            args=(self.stop_event, ),
+            name='video_producer')
+        self._video_producer_thread.start()
+
+        # perintah gerak pelacakan wajah, hanya yang terbaru yang dikirim
+        self._motion_channel = MotionChannel(self.send_command)
+
+        # mode 'rc': loop PID 20 Hz mengirim rc tanpa menunggu balasan
+        # mode 'go': perintah go bertahap lewat motion channel
+        self.tracking_mode = None
+        self._face_controller = FaceController(self.send_rc)
+        self.set_tracking_mode(tracking_mode)
+
+        self._register_metrics()
 
         # set instance untuk pengirim perintah ke drone
         self.send_command('command')
         self.send_command('streamon')
         self.set_speed(self.speed)
 
-    # fungsi untuk menerima response dari drone
-    def receive_response(self, stop_event):
-        while not stop_event.is_set():
-            # log yang akan drone kirim
-            try:
-                self.response, ip = self.socket.recvfrom(3000)
-                logger.info({'action': 'receive_response',
-                             'response': self.response})
-            except socket.error as ex:
-                logger.error({'action': 'receive_response',
-                             'ex': ex})
-                break
+    # fungsi untuk mendaftarkan metric yang dibaca dari instance drone
+    def _register_metrics(self):
+        REGISTRY.callback('drone_command_queue_depth',
+                          'Commands queued or running on the I/O loop',
+                          'gauge', lambda: self._io.pending)
+        for outcome in ('submitted', 'superseded', 'cleared', 'sent'):
+            REGISTRY.callback(
+                'drone_motion_setpoints',
+                'Face tracking motion setpoints by outcome', 'counter',
+                lambda outcome=outcome: getattr(self._motion_channel, outcome),
+                {'outcome': outcome})
+        REGISTRY.callback('drone_state_packets',
+                          'State packets received on the state port',
+                          'counter', lambda: self._telemetry.count)
+        REGISTRY.callback('drone_state_parse_errors',
+                          'State packets that could not be parsed',
+                          'counter', lambda: self._telemetry.parse_errors)
+        for field, name, help_text in (
+                ('bat', 'drone_battery_percent', 'Battery level'),
+                ('h', 'drone_height_cm', 'Height above takeoff point'),
+                ('tof', 'drone_tof_cm', 'Time-of-flight distance')):
+            REGISTRY.callback(
+                name, help_text, 'gauge',
+                lambda field=field: self._latest_state_value(field))
+        REGISTRY.callback('video_frames_decoded',
+                          'Frames read from the decoder', 'counter',
+                          lambda: self._frame_ring.seq)
+        REGISTRY.callback('video_subscribers', 'Connected MJPEG viewers',
+                          'gauge', lambda: self._video_hub.subscribers)
+        for outcome in ('triggered', 'skipped'):
+            REGISTRY.callback(
+                'detection_gate_frames',
+                'Frames checked by the motion gate by outcome', 'counter',
+                lambda outcome=outcome: getattr(self._motion_gate, outcome),
+                {'outcome': outcome})
+        for outcome in ('frames', 'dropped_frames'):
+            REGISTRY.callback(
+                'video_access_units',
+                'H.264 access units assembled by outcome', 'counter',
+                lambda outcome=outcome: getattr(self._video_assembler, outcome),
+                {'outcome': outcome.replace('_frames', '')})
+        REGISTRY.callback('video_stream_gaps',
+                          'Lost or corrupt H.264 data detected', 'counter',
+                          lambda: self._video_assembler.gaps)
+        REGISTRY.callback('video_stream_resyncs',
+                          'Times the stream waited for the next IDR frame',
+                          'counter', lambda: self._video_assembler.resyncs)
+        for outcome in ('hits', 'misses', 'stale'):
+            REGISTRY.callback(
+                'video_tier_cache_lookups',
+                'MJPEG tier cache lookups by outcome', 'counter',
+                lambda outcome=outcome: getattr(self._tier_cache, outcome),
+                {'outcome': outcome})
+        REGISTRY.callback('video_h264_subscribers', 'Connected H.264 viewers',
+                          'gauge', lambda: self._h264_hub.subscribers)
+        REGISTRY.callback('video_h264_overflows',
+                          'H.264 viewer queues reset because they were full',
+                          'counter', lambda: self._h264_hub.overflows)
+        REGISTRY.callback('video_decoding',
+                          'Whether frames are being fed to the decoder',
+                          'gauge', lambda: int(self.is_decoding))
+        REGISTRY.callback('video_arrival_jitter_seconds',
+                          'Interarrival jitter of H.264 access units',
+                          'gauge', lambda: self._video_assembler.jitter)
+
+    # respon terakhir dari drone
+    @property
+    def response(self):
+        return self._io.response
+
+    # fungsi untuk mengambil status drone terakhir
+    def latest_state(self, fields=None):
+        return self._telemetry.latest(fields)
+
+    def _latest_state_value(self, field):
+        state = self.latest_state((field, ))
+        if state is None or state[field] is None:
+            return float('nan')
+        return state[field]
+
+    # fungsi untuk mengambil status drone dalam beberapa detik terakhir
+    def state_window(self, seconds, fields=None):
+        return self._telemetry.window(seconds, fields)
+
+    # fungsi untuk ringkasan min, rata-rata dan max status drone
+    def state_summary(self, seconds, fields=None):
+        return self._telemetry.summary(seconds, fields)
 
     # fungsi untuk menghentikan paksa drone
     def __dell__(self):
@@ -132,50 +351,36 @@ class DroneManager(metaclass=Singleton):
     # fungsi untuk memberhentikan drone
     def stop(self):
         self.stop_event.set()
-        retry = 0
-
-        # jika thread masih terbuka
-        while self._response_thread.isAlive():
-            time.sleep(0.3)
-            if retry > 30:
-                break
-            retry += 1
-        self.socket.close()
-        os.kill(self.proc.pid, 9)
-        import signal
-        os.kill(self.proc.pid, signal.CTRL_C_EVENT)
+        self._video_hub.close()
+        self._h264_hub.close()
+        self._face_detector.stop(timeout=1)
+        self._motion_channel.stop(timeout=1)
+        self._face_controller.stop(timeout=1)
+        self._mission_runner.stop()
+        # socket ditutup dan ffmpeg dihentikan di loop, thread decode
+        # berhenti saat membaca EOF dari stdout ffmpeg
+        self._io.stop(timeout=1)
 
     # fungsi utama untuk mengirim perintah ke drone
-    def send_command(self, command, blocking=True):
-        self._command_thread = threading.Thread(
-            target=self._send_command,
-            args=(command, blocking,))
-        self._command_thread.start()
-
-    # fungsi untuk mengirim perintah ke drone
-    def _send_command(self, command, blocking=True):
-        is_acquire = self._command_semaphore.acquire(blocking=blocking)
-        if is_acquire:
-            with contextlib.ExitStack() as stack:
-                stack.callback(self._command_semaphore.release)
-                logger.info({'action': 'send_command', 'command': command})
-                self.socket.sendto(command.encode('utf-8'), self.drone_address)
-
-                retry = 0
-                # jika tidak ada respon dari drone
-                while self.response is None:
-                    time.sleep(0.3)
-                    if retry > 3:
-                         break
-                    retry += 1
-                if self.response is None:
-                    response = None
-                else:
-                    response = self.response.decode('utf-8')
-                self.response = None
-                return response
-        else:
-            logger.warning({'action': 'send_command', 'command': command, 'status': 'not_acquire'})
+    # mengembalikan future yang berisi CommandResult
+    # jika blocking=False perintah dibuang saat drone masih sibuk
+    def send_command(self, command, blocking=True, timeout=None, retry=None):
+        return self._io.send_command(command, blocking, timeout, retry)
+
+    # coroutine perintah untuk kode yang berjalan di loop I/O drone
+    # (io_loop), bisa dibatalkan dengan task.cancel()
+    async def send_command_async(self, command, blocking=True, timeout=None,
+                                 retry=None):
+        return await self._io.command(command, blocking, timeout, retry)
+
+    @property
+    def io_loop(self):
+        return self._io.loop
+
+    # fungsi untuk mengirim kecepatan rc, drone tidak membalas perintah rc
+    # a: kiri/kanan, b: maju/mundur, c: naik/turun, d: yaw (-100..100)
+    def send_rc(self, a, b, c, d):
+        self._io.send(f'rc {a} {b} {c} {d}'.encode('utf-8'))
 
     # fungsi untuk drone terbang
     def takeoff(self):
@@ -185,15 +390,25 @@ class DroneManager(metaclass=Singleton):
     def land(self):
         return self.send_command('land')
 
-    # fungsi untuk menggerakan drone
-    def move(self, direction, distance):
+    # fungsi untuk mengubah jarak (meter atau feet) menjadi cm
+    # ValueError jika di luar jarak yang diterima drone
+    def distance_to_cm(self, distance):
         distance = float(distance)
         #konversi satuan
         if self.is_imperial:
-            distance = int(round(distance * 30.48))
+            cm = round(distance * 30.48, 0)
         else:
-            distance = int(round(distance * 100))
-        return self.send_command(f'{direction} {distance}')
+            cm = round(distance * 100, 0)
+        # nan dan inf juga gagal di sini sebelum dibulatkan ke int
+        if not MIN_MOVE_CM <= cm <= MAX_MOVE_CM:
+            raise ValueError(f'distance {distance} must be '
+                             f'{MIN_MOVE_CM}-{MAX_MOVE_CM} cm')
+        return int(cm)
+
+    # fungsi untuk menggerakan drone
+    def move(self, direction, distance):
+        return self.send_command(
+            f'{direction} {self.distance_to_cm(distance)}')
 
     # fungsi untuk drone bergerak ke atas
     def up(self, distance=DEFAULT_DISTANCE):
@@ -247,87 +462,95 @@ class DroneManager(metaclass=Singleton):
     def flip_right(self):
         return self.send_command('flip r')
 
+    # fungsi untuk menjalankan misi berupa Mission atau dict
+    # misi yang sedang berjalan dihentikan dulu
+    def run_mission(self, mission):
+        if not isinstance(mission, Mission):
+            mission = parse_mission(mission)
+        self._mission_runner.start(mission)
+
+    # fungsi untuk menghentikan misi saat itu juga
+    def stop_mission(self):
+        return self._mission_runner.stop()
+
+    def mission_status(self):
+        return self._mission_runner.status()
+
+    @property
+    def is_patrol(self):
+        runner = self._mission_runner
+        return (runner.is_running
+                and runner.mission.name == PATROL_MISSION['name'])
+
     # fungsi untuk drone berpatroli
     def patrol(self):
         if not self.is_patrol:
-            self.patrol_event = threading.Event()
-            self._thread_patrol = threading.Thread(
-                target=self._patrol,
-                args=(self._patrol_semaphore, self.patrol_event,))
-            self._thread_patrol.start()
-            self.is_patrol = True
+            self.run_mission(PATROL_MISSION)
 
     # fungsi untuk berhenti patroli
     def stop_patrol(self):
         if self.is_patrol:
-            self.patrol_event.set()
-            retry = 0
-            while self._thread_patrol.isAlive():
-                time.sleep(0.3)
-                if retry > 300:
-                    break
-                retry += 1
-            self.is_patrol = False
-
-    # fungsi untuk rute drone patroli
-    def _patrol(self, semaphore, stop_event):
-        is_acquire = semaphore.acquire(blocking=False)
-        if is_acquire:
-            logger.info({'action': '_patrol', 'status': 'acquire'})
-            with contextlib.ExitStack() as stack:
-                stack.callback(semaphore.release)
-                status = 0
-                while not stop_event.is_set():
-                    status += 1
-                    if status == 1:
-                        self.up()
-                    if status == 2:
-                        self.clockwise(90)
-                    if status == 3:
-                        self.down()
-                    if status == 4:
-                        status = 0
-                    time.sleep(5)
-        else:
-            logger.warning({'action': '_patrol', 'status': 'not_acquire'})
-
-    # fungsi untuk menerima streaming video
-    def receive_video(self, stop_event, pipe_in, host_ip, video_port):
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock_video:
-            sock_video.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock_video.settimeout(.5)
-            sock_video.bind((host_ip, video_port))
-            data = bytearray(2048)
-            while not stop_event.is_set():
-                try:
-                    size, addr = sock_video.recvfrom_into(data)
-                    # logger.info({'action': 'receive_video', 'data': data})
-                except socket.timeout as ex:
-                    logger.warning({'action': 'receive_video', 'ex': ex })
-                    time.sleep(0.5)
-                    continue
-                except socket.error as ex:
-                    logger.error({'action': 'receive_video', 'ex': ex})
-                    break
-                try:
-                    pipe_in.write(data[:size])
-                    pipe_in.flush()
-                except Exception as ex:
-                    logger.error({'action': 'receive_video', 'ex': ex})
-                    break
-
+            self.stop_mission()
+
+    # fungsi untuk menerima datagram video, dipanggil di loop I/O
+    # datagram disusun menjadi frame utuh, setiap frame ditulis sekali
+    # ke ffmpeg diikuti AUD agar langsung di-decode
+    def _on_video(self, data, now):
+        VIDEO_DATAGRAMS.inc()
+        VIDEO_BYTES.inc(len(data))
+        for unit in self._video_assembler.feed(data, now):
+            self._h264_hub.publish(unit, self._video_assembler.parameter_sets)
+            if not self._should_decode(unit):
+                continue
+            started = time.monotonic()
+            if not self._io.write_decoder(unit.data, ACCESS_UNIT_DELIMITER):
+                # ffmpeg tertinggal, decode dimulai lagi dari IDR berikutnya
+                self.is_decoding = False
+                continue
+            written = time.monotonic()
+            PIPE_WRITE_SECONDS.observe(written - started)
+            self._decode_queue.append((unit.timestamp, written))
+
+    # fungsi untuk menentukan apakah frame perlu di-decode
+    # decode hanya boleh dimulai dari IDR agar ffmpeg tidak menerima
+    # frame P tanpa referensi
+    def _should_decode(self, unit):
+        is_snapshot = (self._snapshot_requested_at is not None and
+                       time.monotonic() - self._snapshot_requested_at
+                       < SNAPSHOT_KEEPALIVE)
+        if (self.decode_on_demand and not (
+                self._video_hub.subscribers or self._is_enable_face_detect
+                or is_snapshot)):
+            self.is_decoding = False
+        elif (not self.is_decoding and unit.is_idr
+              and self._io.decoder_backlog <= DECODER_BACKLOG_LIMIT):
+            self.is_decoding = True
+        return self.is_decoding
+
+    # generator frame mentah dari ffmpeg, dibaca ke ring buffer
     def video_binary_generator(self):
-        while True:
+        while not self.stop_event.is_set():
             try:
-                frame = self.proc_stdout.read(FRAME_SIZE)
+                frame = self._frame_ring.read_from(self.proc_stdout)
             except Exception as ex:
                 logger.error({'action': 'video_binary_generator', 'ex': ex})
-                continue
+                break
 
-            if not frame:
-                continue
+            if frame is None:
+                logger.warning({'action': 'video_binary_generator',
+                                'status': 'eof'})
+                break
 
-            frame = np.fromstring(frame, np.uint8).reshape(FRAME_Y, FRAME_X, 3)
+            # umur frame dihitung dari waktu terima datagram pertamanya,
+            # decode adalah waktu dari ditulis ke pipe sampai keluar ffmpeg
+            try:
+                arrival, written = self._decode_queue.popleft()
+            except IndexError:
+                arrival, written = None, None
+            if arrival is not None:
+                frame.timestamp = arrival
+                DECODE_SECONDS.observe(time.monotonic() - written)
+            DECODED_AGE.observe(time.time() - frame.timestamp)
             yield frame
 
     def enable_face_detect(self):
@@ -335,44 +558,199 @@ class DroneManager(metaclass=Singleton):
 
     def disable_face_detect(self):
         self._is_enable_face_detect = False
+        self._motion_channel.clear()
+        self._face_controller.clear()
+
+    # fungsi untuk memilih mode pelacakan 'rc' atau 'go'
+    def set_tracking_mode(self, mode):
+        if mode not in TRACKING_MODES:
+            raise ValueError(f'unknown tracking mode: {mode}')
+        self._motion_channel.clear()
+        self._face_controller.clear()
+        self.tracking_mode = mode
+
+    # fungsi untuk mengatur berapa kali per detik deteksi wajah dijalankan
+    def set_face_detect_rate(self, rate):
+        self._face_detector.set_rate(float(rate))
+
+    # fungsi untuk memilih mode deteksi 'full' atau 'adaptive'
+    def set_face_detect_mode(self, mode):
+        self._face_detector.set_mode(mode)
+
+    # statistik laju deteksi, laju pelacakan dan latensi deteksi
+    def detection_stats(self):
+        stats = self._face_detector.stats()
+        stats.update(self._face_tracker.stats())
+        stats.update(self._motion_gate.stats())
+        return stats
+
+    # daftar wajah yang sedang dilacak, kotak dalam koordinat frame penuh
+    def face_tracks(self):
+        tracks = self._face_tracks.tracks()
+        for track in tracks:
+            track['box'] = self._detection_plane.to_frame([track['box']])[0]
+        return {'policy': self._face_tracks.policy,
+                'locked_id': self._face_tracks.locked_id,
+                'target_id': self._face_tracks.target_id,
+                'tracks': tracks}
+
+    # fungsi untuk memilih wajah target: 'largest', 'center' atau 'id'
+    def set_target_policy(self, policy, track_id=None):
+        self._face_tracks.set_policy(policy, track_id)
+
+    # statistik perintah gerak dan loop kendali rc
+    def motion_stats(self):
+        stats = self._motion_channel.stats()
+        stats.update(self._face_controller.stats())
+        stats['tracking_mode'] = self.tracking_mode
+        return stats
+
+    # fungsi untuk menerbitkan frame jpeg ke hub video
+    def _video_producer(self, stop_event):
+        for encoded in self._encode_video_frames():
+            self._video_hub.publish(encoded)
+            if stop_event.is_set():
+                break
+
+    # generator EncodedFrame untuk satu penonton, frame lama dilewati
+    def video_frame_generator(self):
+        return self._video_hub.subscribe()
+
+    # fungsi untuk mengambil EncodedFrame terakhir tanpa menunggu
+    # mengembalikan None jika belum ada frame yang di-encode
+    def latest_encoded_frame(self):
+        self._snapshot_requested_at = time.monotonic()
+        _, encoded = self._video_hub.latest()
+        return encoded
+
+    # fungsi untuk mengambil jpeg frame pada tingkat kualitas penonton
+    # mengembalikan None jika frame sudah ditimpa dan harus dilewati
+    def encode_for_tier(self, encoded, tier):
+        return self._tier_cache.get(encoded, tier)
 
+    # generator data H.264 Annex-B asli untuk satu penonton
+    def video_h264_generator(self):
+        return self._h264_hub.subscribe()
+
+    # generator jpeg untuk satu penonton, frame lama dilewati
     def video_jpeg_generator(self):
-        for frame in self.video_binary_generator():
+        for encoded in self.video_frame_generator():
+            yield encoded.jpeg
+
+    # statistik decode dan encode video
+    def video_stats(self):
+        return {'frames': self._frame_ring.seq,
+                'decode_fps': self._decode_meter.rate,
+                'ingest': self._video_assembler.stats(),
+                'decoding': self.is_decoding,
+                'h264_subscribers': self._h264_hub.subscribers,
+                'encode_ms': self.encode_time * 1000,
+                'subscribers': self._video_hub.subscribers,
+                **self._tier_cache.stats()}
+
+    # fungsi kendali bertahap dengan perintah go
+    def _go_towards(self, diff_x, diff_y, percent_face):
+        # Inisiasi jarak parameter drone saat mendeteksi wajah
+        drone_x, drone_y, drone_z, speed = 0, 0, 0, self.speed
+        if diff_x < -30:
+            drone_y = -30
+        if diff_x > 30:
+            drone_y = 30
+        if diff_y < -15:
+            drone_z = -30
+        if diff_y > 15:
+            drone_z = 30
+        if percent_face > 0.30:
+            drone_x = -30
+        if percent_face < 0.02:
+            drone_x = 30
+        # wajah sudah di tengah, buang koreksi lama yang menunggu
+        if drone_x == drone_y == drone_z == 0:
+            self._motion_channel.clear()
+        else:
+            self._motion_channel.put(
+                f'go {drone_x} {drone_y} {drone_z} {speed}')
+
+    def _encode_video_frames(self):
+        for video_frame in self.video_binary_generator():
+            self._decode_meter.tick()
+            frame = video_frame.image
             if self._is_enable_face_detect:
-                if self.is_patrol:
+                gray = self._detection_plane.make(frame)
+
+                # selama wajah dilacak deteksi selalu berjalan, selain itu
+                # hanya saat ada gerakan di frame
+                is_tracking = bool(self._face_tracker.boxes())
+                if is_tracking or self._motion_gate.check(gray):
+                    self._face_detector.submit(
+                        gray, video_frame.seq, video_frame.timestamp,
+                        self._face_tracks.boxes())
+                result = self._face_detector.poll()
+                started = time.monotonic()
+                if result is not None:
+                    faces = self._face_tracker.reset(gray, result.faces,
+                                                     result.gray)
+                    self._face_eyes = result.eyes
+                else:
+                    faces = self._face_tracker.update(gray)
+                TRACK_SECONDS.observe(time.monotonic() - started)
+
+                # kotak dari bidang deteksi digambar di frame penuh
+                # mata digambar relatif terhadap kotak wajah yang dilacak
+                plane = self._detection_plane
+                frame_faces = plane.to_frame(faces)
+                if len(self._face_eyes) == len(faces):
+                    for (x, y, w, h), eyes in zip(frame_faces, self._face_eyes):
+                        for (ex, ey, ew, eh) in plane.to_frame(eyes):
+                            cv.rectangle(frame, (x+ex, y+ey),
+                                         (x+ex+ew, y+ey+eh), (0, 255, 0), 2)
+
+                # setiap wajah diberi ID tetap, target digambar merah
+                target = self._face_tracks.update(
+                    faces, is_detection=result is not None)
+                for track in self._face_tracks.tracks():
+                    if not track['is_visible']:
+                        continue
+                    x, y, w, h = plane.to_frame([track['box']])[0]
+                    color = (0, 0, 255) if track['is_target'] else (255, 0, 0)
+                    cv.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+                    cv.putText(frame, str(track['id']), (x, max(y - 6, 12)),
+                               cv.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+                # patroli berhenti saat wajah ditemukan
+                if len(faces) and self.is_patrol:
                     self.stop_patrol()
 
-                gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-                for (x, y, w, h) in faces:
-                    cv.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-
+                # kendali dihitung di koordinat bidang deteksi
+                detect_x, detect_y = self.detect_size
+                if target is not None:
+                    x, y, w, h = target
                     # Inisiasi layer area tangkapan drone dan area jangkauan
                     face_center_x = x + (w/2)
                     face_center_y = y + (h/2)
-                    diff_x = FRAME_CENTER_X - face_center_x
-                    diff_y = FRAME_CENTER_Y - face_center_y
+                    diff_x = detect_x / 2 - face_center_x
+                    diff_y = detect_y / 2 - face_center_y
                     face_area = w * h
-                    percent_face = face_area / FRAME_AREA
-
-                    # Inisiasi jarak parameter drone saat mendeteksi wajah
-                    drone_x, drone_y, drone_z, speed = 0, 0, 0, self.speed
-                    if diff_x < -30:
-                        drone_y = -30
-                    if diff_x > 30:
-                        drone_y = 30
-                    if diff_y < -15:
-                        drone_z = -30
-                    if diff_y > 15:
-                        drone_z = 30
-                    if percent_face > 0.30:
-                        drone_x = -30
-                    if percent_face < 0.02:
-                        drone_x = 30
-                    self.send_command(f'go {drone_x} {drone_y} {drone_z} {speed}',
-                                      blocking=False)
-                    break
-
-            _, jpeg = cv.imencode('.jpg', frame)
+                    percent_face = face_area / (detect_x * detect_y)
+
+                    # error dinormalisasi ke -1..1 untuk loop PID
+                    if self.tracking_mode == TRACKING_MODE_RC:
+                        self._face_controller.set_error(FaceError(
+                            -diff_x / (detect_x / 2), diff_y / (detect_y / 2),
+                            DEFAULT_TARGET_AREA - percent_face,
+                            video_frame.timestamp))
+                    else:
+                        self._go_towards(diff_x, diff_y, percent_face)
+            else:
+                self._face_tracker.clear()
+                self._face_tracks.clear()
+
+            started = time.monotonic()
+            _, jpeg = cv.imencode('.jpg', frame, [
+                cv.IMWRITE_JPEG_QUALITY, DELIVERY_TIERS[0].quality])
             jpeg_binary = jpeg.tobytes()
-            yield jpeg_binary
\ No newline at end of file
+            self.encode_time = time.monotonic() - started
+            ENCODE_SECONDS.observe(self.encode_time)
+            ENCODED_AGE.observe(time.time() - video_frame.timestamp)
+            yield EncodedFrame(jpeg_binary, video_frame.seq,
+                               video_frame.timestamp, video_frame)
@@ -0,0 +1,152 @@
+# import library
+import threading
+
+from droneapp.models.base import Singleton
+from droneapp.models.h264 import AccessUnitAssembler
+from droneapp.models.h264 import AccessUnitHub
+from droneapp.models.metrics import REGISTRY
+from droneapp.models.mission import MissionRunner
+from droneapp.models.telemetry import TelemetryRing
+from droneapp.models.transport import DroneIO
+from droneapp.models.transport import IOLoop
+
+# port bawaan Tello, drone dengan port lain diatur lewat perintah 'port'
+DEFAULT_DRONE_PORT = 8889
+DEFAULT_STATE_PORT = 8890
+DEFAULT_VIDEO_PORT = 11111
+
+
+class ErrorUnknownDrone(Exception):
+    """Error Unknown Drone"""
+
+
+# class untuk satu drone di dalam fleet
+# tidak punya thread sendiri, semua socket dilayani loop FleetManager
+# perintah, retry dan pencocokan respon memakai DroneIO yang sama dengan
+# DroneManager
+class DroneSession(object):
+
+    def __init__(self, drone_id, drone_ip, command_port, state_port,
+                 video_port, io_loop, host_ip='0.0.0.0',
+                 drone_port=DEFAULT_DRONE_PORT):
+        self.drone_id = drone_id
+        self.drone_address = (drone_ip, drone_port)
+        self.command_port = command_port
+        self.state_port = state_port
+        self.video_port = video_port
+        self.telemetry = TelemetryRing()
+        self.video_assembler = AccessUnitAssembler()
+        self.h264_hub = AccessUnitHub()
+
+        self._io = DroneIO(self.drone_address, io_loop=io_loop)
+        try:
+            self._io.open_command((host_ip, command_port))
+            if state_port is not None:
+                self._io.open_udp('state', (host_ip, state_port),
+                                  self.telemetry.write)
+            if video_port is not None:
+                self._io.open_udp('video', (host_ip, video_port),
+                                  self._on_video, reuse_address=True)
+        except OSError:
+            self._io.stop()
+            raise
+        # misi berjalan sebagai coroutine di loop bersama, bukan thread
+        self.mission = MissionRunner(self._io.command, self.send_rc, io_loop)
+
+    # fungsi untuk mengirim perintah, dipanggil dari thread mana saja
+    # mengembalikan future yang berisi CommandResult
+    def send_command(self, command, blocking=True, timeout=None, retry=None):
+        return self._io.send_command(command, blocking, timeout, retry)
+
+    # fungsi untuk mengirim kecepatan rc, drone tidak membalas perintah rc
+    def send_rc(self, a, b, c, d):
+        self._io.send(f'rc {a} {b} {c} {d}'.encode('utf-8'))
+
+    # dipanggil di thread loop untuk setiap datagram video
+    def _on_video(self, data, now):
+        for unit in self.video_assembler.feed(data, now):
+            self.h264_hub.publish(unit, self.video_assembler.parameter_sets)
+
+    def stats(self):
+        return {'id': self.drone_id,
+                'address': f'{self.drone_address[0]}:{self.drone_address[1]}',
+                'command_port': self.command_port,
+                'state_port': self.state_port,
+                'video_port': self.video_port,
+                'pending_commands': self._io.pending,
+                'unmatched': self._io.unmatched,
+                'late': self._io.late,
+                'state_packets': self.telemetry.count,
+                'video': self.video_assembler.stats(),
+                'h264_subscribers': self.h264_hub.subscribers,
+                'mission': self.mission.status()['state']}
+
+    # fungsi untuk menutup socket drone, perintah yang menunggu dibatalkan
+    # di thread loop
+    def close(self, timeout=None):
+        self.mission.stop()
+        self.h264_hub.close()
+        self._io.stop(timeout)
+
+
+# class untuk mengatur banyak drone dengan satu thread I/O
+# semua socket perintah, status dan video didaftarkan ke satu event loop,
+# jumlah thread tetap sama berapa pun drone yang ditambahkan
+class FleetManager(metaclass=Singleton):
+
+    def __init__(self, host_ip='0.0.0.0', drones=()):
+        self.host_ip = host_ip
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._io_loop = IOLoop(name='fleet_io')
+
+        REGISTRY.callback('fleet_sessions', 'Drones in the fleet', 'gauge',
+                          lambda: len(self._sessions))
+
+        for drone in drones:
+            drone = dict(drone)
+            self.add(drone.pop('id'), **drone)
+
+    # fungsi untuk menambahkan drone, mengirim 'command' dan 'streamon'
+    # drone dengan port status/video selain bawaan diatur dengan 'port'
+    def add(self, drone_id, drone_ip, command_port, state_port=None,
+            video_port=None, drone_port=DEFAULT_DRONE_PORT):
+        with self._lock:
+            if drone_id in self._sessions:
+                raise ValueError(f'drone {drone_id} already exists')
+            session = DroneSession(drone_id, drone_ip, command_port,
+                                   state_port, video_port, self._io_loop,
+                                   host_ip=self.host_ip,
+                                   drone_port=drone_port)
+            self._sessions[drone_id] = session
+
+        session.send_command('command')
+        ports = (state_port or DEFAULT_STATE_PORT,
+                 video_port or DEFAULT_VIDEO_PORT)
+        if ports != (DEFAULT_STATE_PORT, DEFAULT_VIDEO_PORT):
+            session.send_command(f'port {ports[0]} {ports[1]}')
+        if video_port:
+            session.send_command('streamon')
+        return session
+
+    def remove(self, drone_id, timeout=None):
+        with self._lock:
+            session = self._sessions.pop(drone_id, None)
+        if session is None:
+            raise ErrorUnknownDrone(f'unknown drone: {drone_id}')
+        session.close(timeout)
+
+    def get(self, drone_id):
+        session = self._sessions.get(drone_id)
+        if session is None:
+            raise ErrorUnknownDrone(f'unknown drone: {drone_id}')
+        return session
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stop(self, timeout=None):
+        for session in self.sessions():
+            self.remove(session.drone_id, timeout)
+        self._io_loop.stop(timeout)
@@ -0,0 +1,373 @@
+# import library
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+START_CODE = b'\x00\x00\x01'
+LONG_START_CODE = b'\x00\x00\x00\x01'
+
+# NAL pembatas frame, ditulis setelah setiap frame agar decoder langsung
+# memproses frame tanpa menunggu awal frame berikutnya
+ACCESS_UNIT_DELIMITER = LONG_START_CODE + b'\x09\xf0'
+
+# tipe NAL unit H.264
+NAL_SLICE = 1
+NAL_IDR = 5
+NAL_SEI = 6
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_AUD = 9
+
+# profile yang SPS-nya berisi informasi chroma dan scaling matrix
+HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+# jarak antar frame Tello (30 fps)
+DEFAULT_FRAME_INTERVAL = 1.0 / 30
+
+# batas buffer tanpa start code sebelum data dianggap rusak
+MAX_PENDING_BYTES = 1 << 20
+
+# antrean frame per penonton H.264 (sekitar 1 detik)
+H264_QUEUE_SIZE = 30
+
+# satu frame utuh (access unit) dalam format Annex-B
+# timestamp adalah waktu datagram pertama frame diterima
+AccessUnit = collections.namedtuple(
+    'AccessUnit', ['data', 'is_idr', 'frame_num', 'timestamp'])
+
+SpsInfo = collections.namedtuple(
+    'SpsInfo', ['log2_max_frame_num', 'separate_colour_plane'])
+
+
+# class untuk membaca bit dan exp-golomb dari RBSP
+class BitReader(object):
+
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def u(self, bits):
+        value = 0
+        for _ in range(bits):
+            index = self._pos >> 3
+            if index >= len(self._data):
+                raise ValueError('read past end of NAL unit')
+            bit = (self._data[index] >> (7 - (self._pos & 7))) & 1
+            value = (value << 1) | bit
+            self._pos += 1
+        return value
+
+    def ue(self):
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError('invalid exp-golomb code')
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self):
+        value = self.ue()
+        if value & 1:
+            return (value + 1) // 2
+        return -(value // 2)
+
+
+# fungsi untuk membuang emulation prevention byte (00 00 03)
+def unescape(data):
+    return bytes(data).replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+def _skip_scaling_list(reader, size):
+    last_scale = next_scale = 8
+    for _ in range(size):
+        if next_scale:
+            next_scale = (last_scale + reader.se() + 256) % 256
+        if next_scale:
+            last_scale = next_scale
+
+
+# fungsi untuk membaca SPS sampai log2_max_frame_num
+def parse_sps(payload):
+    reader = BitReader(unescape(payload))
+    profile_idc = reader.u(8)
+    reader.u(16)
+    reader.ue()
+    separate_colour_plane = False
+    if profile_idc in HIGH_PROFILES:
+        chroma_format_idc = reader.ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = bool(reader.u(1))
+        reader.ue()
+        reader.ue()
+        reader.u(1)
+        if reader.u(1):
+            for i in range(12 if chroma_format_idc == 3 else 8):
+                if reader.u(1):
+                    _skip_scaling_list(reader, 16 if i < 6 else 64)
+    return SpsInfo(reader.ue() + 4, separate_colour_plane)
+
+
+# fungsi untuk membaca frame_num dari header slice
+def parse_frame_num(payload, sps):
+    reader = BitReader(unescape(payload[:32]))
+    reader.ue()
+    reader.ue()
+    reader.ue()
+    if sps.separate_colour_plane:
+        reader.u(2)
+    return reader.u(sps.log2_max_frame_num)
+
+
+# class untuk menyusun datagram video menjadi frame utuh
+# batas frame dicari dari NAL unit, frame yang hilang dideteksi dari
+# frame_num, setelah kehilangan data frame dibuang sampai IDR berikutnya
+class AccessUnitAssembler(object):
+
+    def __init__(self, frame_interval=DEFAULT_FRAME_INTERVAL,
+                 drop_until_idr=True):
+        self.frame_interval = frame_interval
+        self.drop_until_idr = drop_until_idr
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._sps = None
+        self._parameter_sets = {}
+        self._prev_ref_frame_num = None
+        self._is_waiting_idr = drop_until_idr
+        self._last_arrival = None
+        # waktu datagram tempat start code NAL di awal buffer ditemukan
+        self._nal_time = None
+        self._reset_unit()
+
+        self.frames = 0
+        self.dropped_frames = 0
+        self.gaps = 0
+        self.resyncs = 0
+        self.jitter = 0.0
+
+    def _reset_unit(self):
+        self._nals = []
+        self._has_slice = False
+        self._is_idr = False
+        self._is_ref = False
+        self._is_corrupt = False
+        self._frame_num = None
+        self._started_at = None
+
+    # fungsi untuk memasukkan satu datagram, mengembalikan frame yang selesai
+    def feed(self, data, now):
+        units = []
+        self._buffer += data
+
+        pos = self._buffer.find(START_CODE)
+        if pos < 0:
+            if len(self._buffer) > MAX_PENDING_BYTES:
+                self._buffer.clear()
+                self._is_corrupt = True
+            return units
+        if self._nal_time is None:
+            self._nal_time = now
+
+        # setiap NAL membawa waktu datagram awalnya, bukan waktu NAL selesai
+        scan = max(pos + 3, self._scan_from)
+        while True:
+            next_pos = self._buffer.find(START_CODE, scan)
+            if next_pos < 0:
+                break
+            self._handle_nal(self._buffer[pos + 3:next_pos], self._nal_time,
+                             units)
+            self._nal_time = now
+            pos = next_pos
+            scan = pos + 3
+
+        del self._buffer[:pos]
+        # start code bisa terpotong di akhir datagram
+        self._scan_from = max(3, len(self._buffer) - 2)
+        return units
+
+    # fungsi untuk menyelesaikan sisa data di buffer (misalnya di akhir file)
+    def flush(self, now=None):
+        units = []
+        pos = self._buffer.find(START_CODE)
+        if pos >= 0:
+            nal_time = now if self._nal_time is None else self._nal_time
+            self._handle_nal(self._buffer[pos + 3:], nal_time, units)
+        self._buffer.clear()
+        self._scan_from = 0
+        self._nal_time = None
+        if self._has_slice:
+            self._finish(units)
+        return units
+
+    def _handle_nal(self, nal, nal_time, units):
+        # nol di akhir adalah trailing_zero atau awal start code 4 byte
+        end = len(nal)
+        while end and nal[end - 1] == 0:
+            end -= 1
+        nal = bytes(nal[:end])
+        if not nal:
+            return
+
+        header = nal[0]
+        nal_type = header & 0x1f
+        is_slice = nal_type in (NAL_SLICE, NAL_IDR)
+        is_first_slice = is_slice and len(nal) > 1 and nal[1] & 0x80
+        if self._has_slice and (nal_type in (NAL_SEI, NAL_SPS, NAL_PPS,
+                                             NAL_AUD) or is_first_slice):
+            self._finish(units)
+        if self._started_at is None:
+            self._started_at = nal_time
+
+        # forbidden_zero_bit harus 0, selain itu data rusak
+        if header & 0x80:
+            self._is_corrupt = True
+        if nal_type in (NAL_SPS, NAL_PPS):
+            self._parameter_sets[nal_type] = nal
+        if nal_type == NAL_SPS:
+            try:
+                self._sps = parse_sps(nal[1:])
+            except ValueError as ex:
+                logger.warning({'action': 'parse_sps', 'ex': ex})
+        if is_slice and not self._has_slice:
+            self._is_idr = nal_type == NAL_IDR
+            self._is_ref = bool(header & 0x60)
+            if self._sps is not None:
+                try:
+                    self._frame_num = parse_frame_num(nal[1:], self._sps)
+                except ValueError:
+                    self._is_corrupt = True
+
+        if nal_type != NAL_AUD:
+            self._nals.append(nal)
+        self._has_slice = self._has_slice or is_slice
+
+    # fungsi untuk memeriksa kelanjutan frame_num lalu mengeluarkan frame
+    def _finish(self, units):
+        is_gap = self._is_corrupt
+        if (not self._is_idr and self._frame_num is not None
+                and self._prev_ref_frame_num is not None):
+            max_frame_num = 1 << self._sps.log2_max_frame_num
+            expected = (self._prev_ref_frame_num + 1) % max_frame_num
+            is_gap = is_gap or self._frame_num != expected
+        if self._is_ref and self._frame_num is not None:
+            self._prev_ref_frame_num = self._frame_num
+
+        if is_gap:
+            self.gaps += 1
+            if self.drop_until_idr and not self._is_waiting_idr:
+                self.resyncs += 1
+                self._is_waiting_idr = True
+                logger.warning({'action': 'access_unit', 'status': 'gap',
+                                'frame_num': self._frame_num})
+
+        if self._is_waiting_idr and not (self._is_idr and not is_gap):
+            self.dropped_frames += 1
+        else:
+            self._is_waiting_idr = False
+            data = b''.join(LONG_START_CODE + nal for nal in self._nals)
+            units.append(AccessUnit(data, self._is_idr, self._frame_num,
+                                    self._started_at))
+            self._update_jitter(self._started_at)
+            self.frames += 1
+        self._reset_unit()
+
+    # jitter dihitung seperti RFC 3550 dari jarak kedatangan frame
+    def _update_jitter(self, arrival):
+        if arrival is None:
+            return
+        if self._last_arrival is not None:
+            deviation = abs(arrival - self._last_arrival - self.frame_interval)
+            self.jitter += (deviation - self.jitter) / 16
+        self._last_arrival = arrival
+
+    # SPS dan PPS terakhir, dibutuhkan decoder sebelum frame IDR
+    @property
+    def parameter_sets(self):
+        return b''.join(LONG_START_CODE + self._parameter_sets[nal_type]
+                        for nal_type in (NAL_SPS, NAL_PPS)
+                        if nal_type in self._parameter_sets)
+
+    def stats(self):
+        return {'frames': self.frames, 'dropped_frames': self.dropped_frames,
+                'gaps': self.gaps, 'resyncs': self.resyncs,
+                'jitter_ms': self.jitter * 1000}
+
+
+class _Subscriber(object):
+    __slots__ = ('queue', 'is_waiting_idr')
+
+    def __init__(self):
+        self.queue = []
+        self.is_waiting_idr = True
+
+
+# class untuk meneruskan frame H.264 asli ke banyak penonton tanpa decode
+# setiap penonton punya antrean terbatas, jika penuh antrean dikosongkan
+# dan penonton menunggu IDR berikutnya agar gambar tidak rusak
+class AccessUnitHub(object):
+
+    def __init__(self, queue_size=H264_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._cond = threading.Condition()
+        self._subscribers = set()
+        self._is_closed = False
+        self.overflows = 0
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    # fungsi untuk menerbitkan satu frame ke semua penonton
+    def publish(self, unit, parameter_sets=b''):
+        if not self._subscribers:
+            return
+        with self._cond:
+            for subscriber in self._subscribers:
+                if (not subscriber.is_waiting_idr
+                        and len(subscriber.queue) >= self.queue_size):
+                    subscriber.queue.clear()
+                    subscriber.is_waiting_idr = True
+                    self.overflows += 1
+                if not subscriber.is_waiting_idr:
+                    subscriber.queue.append(unit.data)
+                elif unit.is_idr:
+                    # penonton selalu mulai dari IDR yang diawali SPS/PPS
+                    subscriber.is_waiting_idr = False
+                    if unit.data[4] & 0x1f != NAL_SPS:
+                        subscriber.queue.append(parameter_sets)
+                    subscriber.queue.append(unit.data)
+            self._cond.notify_all()
+
+    # generator data Annex-B untuk satu penonton
+    def subscribe(self):
+        subscriber = _Subscriber()
+        with self._cond:
+            self._subscribers.add(subscriber)
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: subscriber.queue or self._is_closed)
+                    if self._is_closed:
+                        return
+                    chunk = b''.join(subscriber.queue)
+                    subscriber.queue.clear()
+                yield chunk
+        finally:
+            with self._cond:
+                self._subscribers.discard(subscriber)
+
+    # fungsi untuk menutup hub dan membangunkan semua penonton
+    def close(self):
+        with self._cond:
+            self._is_closed = True
+            self._cond.notify_all()
+
+
+# fungsi untuk memecah seluruh isi file H.264 menjadi frame
+def split_access_units(data):
+    assembler = AccessUnitAssembler(drop_until_idr=False)
+    units = assembler.feed(data, None)
+    units.extend(assembler.flush())
+    return [unit.data for unit in units]
@@ -0,0 +1,164 @@
+# import library
+import bisect
+import threading
+
+# batas bucket histogram waktu (detik)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+# fungsi untuk menulis label dalam format teks prometheus
+def _format_labels(labels, extra=None):
+    items = list(labels)
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    body = ','.join(f'{key}="{value}"' for key, value in items)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+# class untuk angka yang hanya bertambah
+# setiap metric punya lock sendiri, tidak ada lock global
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, labels=()):
+        self.labels = labels
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name):
+        yield name + '_total', self.labels, self.value
+
+
+# class untuk nilai yang bisa naik turun
+class Gauge(object):
+    kind = 'gauge'
+
+    def __init__(self, labels=()):
+        self.labels = labels
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        yield name, self.labels, self.value
+
+
+# class untuk metric yang nilainya dibaca dari fungsi saat scrape
+class CallbackMetric(object):
+
+    def __init__(self, kind, fn, labels=()):
+        self.kind = kind
+        self.labels = labels
+        self._fn = fn
+
+    def samples(self, name):
+        suffix = '_total' if self.kind == 'counter' else ''
+        yield name + suffix, self.labels, self._fn()
+
+
+# class untuk sebaran nilai dalam bucket
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, labels=()):
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'), ),
+                                       counts):
+            cumulative += bucket_count
+            yield (name + '_bucket', self.labels,
+                   cumulative, ('le', _format_value(bound)))
+        yield name + '_sum', self.labels, total
+        yield name + '_count', self.labels, count
+
+
+# class untuk menyimpan semua metric dan menulisnya dalam format teks
+class MetricsRegistry(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}
+
+    def _register(self, name, help_text, labels, factory):
+        labels = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = [None, help_text, {}]
+            series = family[2]
+            if labels not in series:
+                series[labels] = factory(labels)
+            metric = series[labels]
+            family[0] = metric.kind
+        return metric
+
+    def counter(self, name, help_text, labels=None):
+        return self._register(name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text, labels=None):
+        return self._register(name, help_text, labels, Gauge)
+
+    def histogram(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._register(
+            name, help_text, labels,
+            lambda labels: Histogram(buckets=buckets, labels=labels))
+
+    # fungsi untuk mendaftarkan metric yang nilainya diambil dari fungsi
+    def callback(self, name, help_text, kind, fn, labels=None):
+        return self._register(
+            name, help_text, labels,
+            lambda labels: CallbackMetric(kind, fn, labels=labels))
+
+    # fungsi untuk menulis semua metric dalam format teks prometheus
+    def render(self):
+        with self._lock:
+            families = [(name, kind, help_text, list(series.values()))
+                        for name, (kind, help_text, series)
+                        in sorted(self._families.items())]
+        lines = []
+        for name, kind, help_text, series in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for metric in series:
+                for sample in metric.samples(name):
+                    sample_name, labels, value = sample[:3]
+                    extra = sample[3] if len(sample) > 3 else None
+                    lines.append(f'{sample_name}'
+                                 f'{_format_labels(labels, extra)} '
+                                 f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# registry bawaan yang dipakai seluruh aplikasi
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,246 @@
+# import library
+import asyncio
+import collections
+import json
+import logging
+import math
+import threading
+import time
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+# status misi
+MISSION_IDLE = 'idle'
+MISSION_RUNNING = 'running'
+MISSION_DONE = 'done'
+MISSION_FAILED = 'failed'
+MISSION_STOPPED = 'stopped'
+
+# jumlah hasil langkah terakhir yang disimpan untuk status
+MISSION_HISTORY = 20
+
+# batas retry satu langkah agar misi tidak tertahan di satu perintah
+MAX_STEP_RETRY = 10
+
+# satu langkah misi: perintah SDK atau jeda (wait detik)
+# timeout dan retry None memakai aturan bawaan perintah
+MissionStep = collections.namedtuple(
+    'MissionStep', ['command', 'timeout', 'retry', 'wait'])
+
+# misi: daftar langkah, diulang terus jika loop
+# on_error 'abort' menghentikan misi saat langkah gagal, 'continue' lanjut
+Mission = collections.namedtuple(
+    'Mission', ['name', 'steps', 'loop', 'on_error'])
+
+# patroli bawaan: naik, putar 90 derajat, turun, diulang
+PATROL_MISSION = {
+    'name': 'patrol',
+    'loop': True,
+    'steps': [{'command': 'up 50'},
+              {'command': 'cw 90'},
+              {'command': 'down 50'}],
+}
+
+MISSIONS = {'patrol': PATROL_MISSION}
+
+
+class ErrorInvalidMission(Exception):
+    """Error Invalid Mission"""
+
+
+def _parse_step(index, step):
+    if not isinstance(step, dict):
+        raise ErrorInvalidMission(f'step {index} must be an object')
+    timeout = step.get('timeout')
+    retry = step.get('retry')
+    wait = step.get('wait')
+    try:
+        timeout = None if timeout is None else float(timeout)
+        retry = None if retry is None else int(retry)
+        wait = None if wait is None else float(wait)
+    except (TypeError, ValueError, OverflowError):
+        raise ErrorInvalidMission(f'step {index} has invalid numbers')
+
+    # titik tujuan relatif {'go': [x, y, z], 'speed': cm/s}
+    command = step.get('command')
+    if 'go' in step:
+        try:
+            values = [float(value) for value in step['go']]
+            values.append(float(step.get('speed', 50)))
+            if not all(math.isfinite(value) for value in values):
+                raise ValueError(values)
+            x, y, z, speed = (int(value) for value in values)
+        except (TypeError, ValueError):
+            raise ErrorInvalidMission(f'step {index} has an invalid go')
+        command = f'go {x} {y} {z} {speed}'
+
+    if command is None and wait is None:
+        raise ErrorInvalidMission(f'step {index} needs command, go or wait')
+    if command is not None and (not isinstance(command, str)
+                                or not command.strip()):
+        raise ErrorInvalidMission(f'step {index} has an invalid command')
+    # nan dan inf ditolak agar misi tidak tertahan di satu langkah
+    if wait is not None and not (math.isfinite(wait) and wait >= 0):
+        raise ErrorInvalidMission(f'step {index} needs a finite wait >= 0')
+    if timeout is not None and not (math.isfinite(timeout) and timeout > 0):
+        raise ErrorInvalidMission(f'step {index} needs a positive timeout')
+    if retry is not None and not 0 <= retry <= MAX_STEP_RETRY:
+        raise ErrorInvalidMission(
+            f'step {index} needs a retry of 0-{MAX_STEP_RETRY}')
+    return MissionStep(command and command.strip(), timeout, retry, wait)
+
+
+# fungsi untuk memeriksa dan mengubah dict misi menjadi Mission
+def parse_mission(data):
+    if not isinstance(data, dict) or not isinstance(data.get('steps'), list):
+        raise ErrorInvalidMission('mission must be an object with steps')
+    if not data['steps']:
+        raise ErrorInvalidMission('mission has no steps')
+    on_error = data.get('on_error', 'abort')
+    if on_error not in ('abort', 'continue'):
+        raise ErrorInvalidMission(f'unknown on_error: {on_error}')
+    steps = [_parse_step(index, step)
+             for index, step in enumerate(data['steps'])]
+    return Mission(str(data.get('name', 'mission')), steps,
+                   bool(data.get('loop', False)), on_error)
+
+
+# fungsi untuk membaca misi dari teks JSON atau YAML
+def loads_mission(text, is_yaml=False):
+    try:
+        if is_yaml:
+            if yaml is None:
+                raise ErrorInvalidMission('PyYAML is not installed')
+            data = yaml.safe_load(text)
+        else:
+            data = json.loads(text)
+    except ValueError as ex:
+        raise ErrorInvalidMission(f'cannot parse mission: {ex}')
+    return parse_mission(data)
+
+
+# fungsi untuk membaca misi dari file .json, .yaml atau .yml
+def load_mission(path):
+    with open(path) as f:
+        return loads_mission(f.read(),
+                             is_yaml=path.endswith(('.yaml', '.yml')))
+
+
+# class untuk menjalankan satu misi sebagai coroutine di loop I/O drone
+# langkah berikutnya dikirim begitu drone menjawab 'ok', bukan setelah
+# jeda tetap, stop langsung membatalkan coroutine tanpa menunggu jawaban
+# tidak membuat thread sendiri sehingga banyak misi (fleet) bisa berjalan
+# di satu loop
+class MissionRunner(object):
+
+    def __init__(self, command, send_rc, io_loop):
+        self._command = command
+        self._send_rc = send_rc
+        self._io_loop = io_loop
+        self._lock = threading.Lock()
+        self._task = None
+        self._run_id = 0
+        self.mission = None
+        self.state = MISSION_IDLE
+        self.step = None
+        self.loops = 0
+        self.started_at = None
+        self.history = collections.deque(maxlen=MISSION_HISTORY)
+
+    @property
+    def is_running(self):
+        return self.state == MISSION_RUNNING
+
+    # fungsi untuk memulai misi, misi yang sedang berjalan dihentikan dulu
+    def start(self, mission):
+        with self._lock:
+            self._stop_locked()
+            self.mission = mission
+            self.state = MISSION_RUNNING
+            self.step = 0
+            self.loops = 0
+            self.started_at = time.monotonic()
+            self.history.clear()
+            self._run_id += 1
+            self._task = self._io_loop.run(self._run(mission, self._run_id))
+
+    # fungsi untuk menghentikan misi saat itu juga
+    # drone diminta diam di tempat dengan rc 0 0 0 0
+    def stop(self):
+        with self._lock:
+            return self._stop_locked()
+
+    # perintah yang masih menunggu ikut dibatalkan agar perintah operator
+    # berikutnya tidak tertahan, respon perintah yang dibatalkan dibuang
+    # oleh DroneIO saat tiba
+    def _stop_locked(self):
+        if not self.is_running:
+            return False
+        self._task.cancel()
+        self.state = MISSION_STOPPED
+        try:
+            self._send_rc(0, 0, 0, 0)
+        except OSError as ex:
+            logger.error({'action': 'mission', 'ex': ex})
+        logger.info({'action': 'mission', 'name': self.mission.name,
+                     'status': MISSION_STOPPED})
+        return True
+
+    def status(self):
+        mission = self.mission
+        return {'name': mission and mission.name, 'state': self.state,
+                'step': self.step, 'steps': mission and len(mission.steps),
+                'loops': self.loops, 'history': list(self.history)}
+
+    # error apa pun di langkah misi mengakhiri misi sebagai failed
+    async def _run(self, mission, run_id):
+        logger.info({'action': 'mission', 'name': mission.name,
+                     'status': MISSION_RUNNING})
+        try:
+            state = await self._run_steps(mission)
+        except Exception as ex:
+            logger.error({'action': 'mission', 'name': mission.name,
+                          'ex': ex})
+            state = MISSION_FAILED
+        self._finish(mission, run_id, state)
+
+    async def _run_steps(self, mission):
+        while True:
+            for index, step in enumerate(mission.steps):
+                self.step = index
+                is_ok = await self._run_step(step)
+                if not is_ok and mission.on_error == 'abort':
+                    return MISSION_FAILED
+            self.loops += 1
+            if not mission.loop:
+                return MISSION_DONE
+
+    async def _run_step(self, step):
+        if step.command is None:
+            await asyncio.sleep(step.wait)
+            return True
+
+        started = time.monotonic()
+        result = await self._command(step.command, timeout=step.timeout,
+                                     retry=step.retry)
+        self.history.append({'command': result.command,
+                             'status': result.status, 'rtt': result.rtt,
+                             'attempts': result.attempts,
+                             'elapsed': time.monotonic() - started})
+        if step.wait:
+            await asyncio.sleep(step.wait)
+        return result.status == 'ok'
+
+    # status tidak diubah jika misi ini sudah dihentikan atau diganti
+    def _finish(self, mission, run_id, state):
+        with self._lock:
+            if run_id != self._run_id or not self.is_running:
+                return
+            self.state = state
+        logger.info({'action': 'mission', 'name': mission.name,
+                     'status': state})
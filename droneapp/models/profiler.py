@@ -0,0 +1,77 @@
+# import library
+import collections
+import os
+import sys
+import threading
+import time
+
+# lama dan laju sampling bawaan
+DEFAULT_PROFILE_SECONDS = 10.0
+DEFAULT_PROFILE_HZ = 100.0
+MAX_PROFILE_SECONDS = 120.0
+MAX_PROFILE_HZ = 1000.0
+
+
+class ErrorProfilerBusy(Exception):
+    """Error Profiler Busy"""
+
+
+# fungsi untuk menamai satu frame stack
+def _frame_label(frame):
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+# class untuk mengambil sampel stack semua thread selama beberapa detik
+# tidak ada thread atau hook yang berjalan saat tidak sedang merekam,
+# jadi tidak ada overhead di luar waktu capture
+class SamplingProfiler(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    # fungsi untuk merekam stack dan mengembalikan format collapsed stack
+    # setiap baris: nama_thread;frame_luar;...;frame_dalam jumlah_sampel
+    def capture(self, seconds=DEFAULT_PROFILE_SECONDS, hz=DEFAULT_PROFILE_HZ):
+        if not self._lock.acquire(blocking=False):
+            raise ErrorProfilerBusy('profiler is already capturing')
+        try:
+            return self._capture(seconds, hz)
+        finally:
+            self._lock.release()
+
+    def _capture(self, seconds, hz):
+        interval = 1.0 / hz
+        me = threading.get_ident()
+        counts = collections.Counter()
+        names = {}
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while next_sample < deadline:
+            frames = sys._current_frames()
+            if frames.keys() - names.keys():
+                names = {thread.ident: thread.name
+                         for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                counts[';'.join(reversed(stack))] += 1
+            # referensi frame dilepas agar tidak menahan objek thread lain
+            frame = frames = None
+
+            next_sample += interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in counts.most_common())
+
+
+PROFILER = SamplingProfiler()
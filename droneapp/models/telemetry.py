@@ -0,0 +1,121 @@
+# import library
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# field status yang dikirim Tello ke port 8890 sekitar 10 kali per detik
+STATE_FIELDS = ('pitch', 'roll', 'yaw', 'vgx', 'vgy', 'vgz', 'templ',
+                'temph', 'tof', 'h', 'bat', 'baro', 'time', 'agx', 'agy',
+                'agz')
+STATE_DTYPE = np.dtype([('timestamp', 'f8')] +
+                       [(name, 'f4') for name in STATE_FIELDS])
+
+# 3000 baris = 5 menit pada 10 Hz
+TELEMETRY_RING_SIZE = 3000
+
+# batas jendela query (detik)
+MAX_STATE_WINDOW = 600.0
+
+_FIELD_INDEX = {name.encode(): index + 1
+                for index, name in enumerate(STATE_FIELDS)}
+
+
+class ErrorUnknownStateField(Exception):
+    """Error Unknown State Field"""
+
+
+# fungsi untuk memeriksa nama field yang diminta
+def check_fields(fields):
+    if fields is None:
+        return STATE_FIELDS
+    unknown = [name for name in fields if name not in STATE_FIELDS]
+    if unknown:
+        raise ErrorUnknownStateField(f'unknown state fields: {unknown}')
+    return tuple(fields)
+
+
+# class untuk menyimpan status drone di ring buffer numpy yang dialokasikan
+# sekali, setiap paket ditulis sebagai satu baris structured array
+class TelemetryRing(object):
+
+    def __init__(self, size=TELEMETRY_RING_SIZE):
+        self._buffer = np.zeros(size, STATE_DTYPE)
+        self._row = [float('nan')] * len(STATE_DTYPE.names)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.parse_errors = 0
+
+    # fungsi untuk mengurai satu paket status dan menyimpannya
+    # field yang tidak dikirim (misalnya mission pad) diabaikan
+    def write(self, data, timestamp=None):
+        row = self._row
+        row[0] = time.time() if timestamp is None else timestamp
+        for index in range(1, len(row)):
+            row[index] = float('nan')
+        try:
+            for item in bytes(data).split(b';'):
+                key, _, value = item.partition(b':')
+                index = _FIELD_INDEX.get(key.strip())
+                if index is not None:
+                    row[index] = float(value)
+        except ValueError as ex:
+            self.parse_errors += 1
+            logger.warning({'action': 'telemetry', 'ex': ex})
+            return False
+
+        with self._lock:
+            self._buffer[self.count % len(self._buffer)] = tuple(row)
+            self.count += 1
+        return True
+
+    # fungsi untuk mengambil baris-baris yang tersimpan sesuai urutan waktu
+    def _ordered(self):
+        size = len(self._buffer)
+        if self.count <= size:
+            return self._buffer[:self.count].copy()
+        start = self.count % size
+        return np.concatenate((self._buffer[start:], self._buffer[:start]))
+
+    # fungsi untuk mengambil status terakhir, None jika belum ada
+    def latest(self, fields=None):
+        fields = check_fields(fields)
+        with self._lock:
+            if not self.count:
+                return None
+            row = self._buffer[(self.count - 1) % len(self._buffer)].copy()
+        state = {'timestamp': float(row['timestamp'])}
+        for name in fields:
+            value = float(row[name])
+            # field yang tidak dikirim drone bernilai None
+            state[name] = None if np.isnan(value) else value
+        return state
+
+    # fungsi untuk mengambil status dalam beberapa detik terakhir
+    # hasilnya array per field, cocok untuk grafik atau dijadikan JSON
+    def window(self, seconds, fields=None, now=None):
+        fields = check_fields(fields)
+        if now is None:
+            now = time.time()
+        with self._lock:
+            rows = self._ordered()
+        rows = rows[rows['timestamp'] >= now - seconds]
+        result = {'timestamp': rows['timestamp']}
+        result.update((name, rows[name]) for name in fields)
+        return result
+
+    # fungsi untuk menghitung min, rata-rata dan max dalam jendela waktu
+    def summary(self, seconds, fields=None, now=None):
+        values = self.window(seconds, fields, now)
+        count = len(values.pop('timestamp'))
+        result = {'count': count}
+        for name, column in values.items():
+            column = column[~np.isnan(column)]
+            if len(column):
+                result[name] = {'min': float(column.min()),
+                                'mean': float(column.mean()),
+                                'max': float(column.max())}
+        return result
@@ -0,0 +1,310 @@
+# import library
+import logging
+import threading
+
+import cv2 as cv
+import numpy as np
+
+from droneapp.models.base import RateMeter
+
+logger = logging.getLogger(__name__)
+
+# jumlah titik fitur yang dilacak di dalam setiap kotak wajah
+MAX_TRACK_POINTS = 30
+
+# kotak dianggap hilang jika titik yang berhasil dilacak kurang dari ini
+MIN_TRACK_POINTS = 4
+
+# batas IOU agar deteksi dianggap wajah yang sama dengan track
+IOU_THRESHOLD = 0.3
+
+# jika IOU kecil (gerakan cepat), jarak titik tengah dibandingkan dengan
+# ukuran kotak track
+CENTROID_GATE = 0.5
+
+# track dihapus setelah tidak ditemukan sebanyak ini hasil deteksi
+# berturut-turut, frame di antara deteksi tidak dihitung
+MAX_TRACK_MISSES = 15
+
+# cara memilih wajah yang diikuti drone
+TARGET_POLICY_LARGEST = 'largest'
+TARGET_POLICY_CENTER = 'center'
+TARGET_POLICY_ID = 'id'
+TARGET_POLICIES = (TARGET_POLICY_LARGEST, TARGET_POLICY_CENTER,
+                   TARGET_POLICY_ID)
+
+LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                 criteria=(cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT,
+                           10, 0.03))
+
+
+# class untuk menggeser kotak wajah di antara dua deteksi
+# memakai optical flow Lucas-Kanade pada titik fitur di dalam kotak
+class FlowTracker(object):
+
+    def __init__(self, max_points=MAX_TRACK_POINTS,
+                 min_points=MIN_TRACK_POINTS):
+        self.max_points = max_points
+        self.min_points = min_points
+        self._prev_gray = None
+        self._boxes = []
+        self._points = []
+        self.meter = RateMeter()
+
+    # fungsi untuk mengganti kotak dengan hasil deteksi terbaru
+    # detect_gray adalah frame tempat wajah dideteksi, titik fitur diambil
+    # dari frame itu lalu digeser dengan optical flow sampai frame gray
+    # agar kotak tidak tertinggal sejauh latensi deteksi
+    def reset(self, gray, faces, detect_gray=None):
+        if detect_gray is None:
+            detect_gray = gray
+        self._boxes = []
+        self._points = []
+        for (x, y, w, h) in faces:
+            points = cv.goodFeaturesToTrack(
+                detect_gray[y:y+h, x:x+w], maxCorners=self.max_points,
+                qualityLevel=0.01, minDistance=3)
+            if points is None:
+                points = np.empty((0, 1, 2), np.float32)
+            else:
+                points += np.array([x, y], np.float32)
+            self._boxes.append(np.array([x, y, w, h], np.float32))
+            self._points.append(points)
+        self._prev_gray = gray
+        if detect_gray is not gray and sum(len(p) for p in self._points):
+            # kotak yang gagal dilacak tetap di posisi hasil deteksi
+            self._flow(detect_gray, gray, keep_lost=True)
+        return self.boxes()
+
+    # fungsi untuk menggeser kotak mengikuti gerakan titik fitur
+    def update(self, gray):
+        self.meter.tick()
+        prev_gray, self._prev_gray = self._prev_gray, gray
+        counts = [len(points) for points in self._points]
+        if prev_gray is None or not sum(counts):
+            self.clear()
+            self._prev_gray = gray
+            return []
+        self._flow(prev_gray, gray)
+        return self.boxes()
+
+    def _flow(self, prev_gray, gray, keep_lost=False):
+        counts = [len(points) for points in self._points]
+        points = np.concatenate(self._points)
+        moved, status, _ = cv.calcOpticalFlowPyrLK(
+            prev_gray, gray, points, None, **LK_PARAMS)
+        status = status.reshape(-1).astype(bool)
+
+        height, width = gray.shape[:2]
+        boxes, tracked_points = [], []
+        start = 0
+        for box, count in zip(self._boxes, counts):
+            part = slice(start, start + count)
+            start += count
+            ok = status[part]
+            if ok.sum() < self.min_points:
+                if keep_lost:
+                    boxes.append(box)
+                    tracked_points.append(points[part])
+                continue
+            shift = np.median(moved[part][ok] - points[part][ok], axis=0)
+            box[:2] += shift.reshape(2)
+            box[0] = np.clip(box[0], 0, width - box[2])
+            box[1] = np.clip(box[1], 0, height - box[3])
+            boxes.append(box)
+            tracked_points.append(moved[part][ok].reshape(-1, 1, 2))
+
+        self._boxes = boxes
+        self._points = tracked_points
+
+    def boxes(self):
+        return [tuple(int(v) for v in box) for box in self._boxes]
+
+    def clear(self):
+        self._prev_gray = None
+        self._boxes = []
+        self._points = []
+
+    def stats(self):
+        return {'track_fps': self.meter.rate, 'tracks': len(self._boxes)}
+
+
+def _as_boxes(boxes):
+    return np.asarray(boxes, np.float32).reshape(-1, 4)
+
+
+# fungsi untuk menghitung IOU semua pasangan kotak (x, y, w, h)
+# hasilnya matriks len(a) x len(b)
+def iou_matrix(a, b):
+    a, b = _as_boxes(a), _as_boxes(b)
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2:3] * a[:, 3:4]) + (b[:, 2] * b[:, 3]) - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+# fungsi untuk menilai kecocokan track dengan deteksi
+# pasangan dengan IOU cukup bernilai 1..2, pasangan yang hanya dekat
+# titik tengahnya bernilai 0..1, selain itu 0
+def match_scores(tracks, detections, iou_threshold=IOU_THRESHOLD,
+                 centroid_gate=CENTROID_GATE):
+    tracks, detections = _as_boxes(tracks), _as_boxes(detections)
+    iou = iou_matrix(tracks, detections)
+    track_centers = tracks[:, :2] + tracks[:, 2:] / 2
+    detection_centers = detections[:, :2] + detections[:, 2:] / 2
+    distance = np.linalg.norm(
+        track_centers[:, None, :] - detection_centers[None, :, :], axis=2)
+    size = np.maximum(tracks[:, 2:3], tracks[:, 3:4])
+    distance = distance / np.maximum(size, 1.0)
+    return np.where(
+        iou >= iou_threshold, 1.0 + iou,
+        np.where(distance < centroid_gate,
+                 1.0 - distance / centroid_gate, 0.0))
+
+
+# fungsi untuk memasangkan track dan deteksi secara greedy dari nilai
+# tertinggi, mengembalikan daftar (indeks track, indeks deteksi)
+def associate(scores):
+    scores = np.array(scores, np.float32)
+    matches = []
+    while scores.size:
+        row, col = np.unravel_index(np.argmax(scores), scores.shape)
+        if scores[row, col] <= 0:
+            break
+        matches.append((int(row), int(col)))
+        scores[row, :] = 0
+        scores[:, col] = 0
+    return matches
+
+
+class _Track(object):
+    __slots__ = ('id', 'box', 'hits', 'misses', 'is_visible')
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.hits = 1
+        self.misses = 0
+        self.is_visible = True
+
+
+# class untuk memberi ID tetap ke setiap wajah dan memilih target drone
+# target bersifat lengket: tetap diikuti selama track-nya masih ada,
+# baru dipilih ulang sesuai kebijakan jika track hilang
+class FaceTracks(object):
+
+    def __init__(self, frame_size, policy=TARGET_POLICY_LARGEST,
+                 max_misses=MAX_TRACK_MISSES):
+        self.frame_size = frame_size
+        self.max_misses = max_misses
+        self._lock = threading.Lock()
+        self._tracks = []
+        self._next_id = 1
+        self.policy = None
+        self.locked_id = None
+        self.target_id = None
+        self.set_policy(policy)
+
+    # fungsi untuk memilih kebijakan target, track_id untuk kebijakan 'id'
+    def set_policy(self, policy, track_id=None):
+        if policy not in TARGET_POLICIES:
+            raise ValueError(f'unknown target policy: {policy}')
+        if policy == TARGET_POLICY_ID and track_id is None:
+            raise ValueError('track id is required to lock a target')
+        with self._lock:
+            self.policy = policy
+            self.locked_id = track_id if policy == TARGET_POLICY_ID else None
+            self.target_id = None
+            self._select()
+
+    # fungsi untuk memasangkan kotak wajah frame ini ke track
+    # is_detection True jika kotak berasal dari hasil deteksi baru, hanya
+    # saat itu track yang tidak ditemukan dihitung hilang
+    # mengembalikan kotak target atau None jika target tidak terlihat
+    def update(self, boxes, is_detection=True):
+        with self._lock:
+            matches = []
+            if self._tracks and len(boxes):
+                matches = associate(match_scores(
+                    [track.box for track in self._tracks], boxes))
+            matched_tracks = {row for row, _ in matches}
+            matched_boxes = {col for _, col in matches}
+
+            for row, col in matches:
+                track = self._tracks[row]
+                track.box = tuple(boxes[col])
+                track.hits += 1
+                if is_detection:
+                    track.misses = 0
+            for row, track in enumerate(self._tracks):
+                track.is_visible = row in matched_tracks
+                if is_detection and not track.is_visible:
+                    track.misses += 1
+            self._tracks = [track for track in self._tracks
+                            if track.misses <= self.max_misses]
+            for col, box in enumerate(boxes):
+                if col not in matched_boxes:
+                    self._tracks.append(_Track(self._next_id, tuple(box)))
+                    self._next_id += 1
+
+            self._select()
+            return self._target_box()
+
+    def _visible(self):
+        return [track for track in self._tracks if track.is_visible]
+
+    def _select(self):
+        if self.policy == TARGET_POLICY_ID:
+            self.target_id = self.locked_id
+            return
+        ids = {track.id for track in self._tracks}
+        if self.target_id in ids:
+            return
+
+        visible = self._visible()
+        if not visible:
+            self.target_id = None
+            return
+        boxes = _as_boxes([track.box for track in visible])
+        if self.policy == TARGET_POLICY_LARGEST:
+            index = np.argmax(boxes[:, 2] * boxes[:, 3])
+        else:
+            center = np.array(self.frame_size, np.float32) / 2
+            centers = boxes[:, :2] + boxes[:, 2:] / 2
+            index = np.argmin(np.linalg.norm(centers - center, axis=1))
+        self.target_id = visible[int(index)].id
+
+    def _target_box(self):
+        for track in self._tracks:
+            if track.id == self.target_id and track.is_visible:
+                return track.box
+        return None
+
+    # fungsi untuk mengambil kotak target terakhir
+    def target(self):
+        with self._lock:
+            return self._target_box()
+
+    # kotak semua track yang masih hidup, dipakai sebagai area pencarian
+    def boxes(self):
+        with self._lock:
+            return [track.box for track in self._tracks]
+
+    # daftar track untuk API, kotak di koordinat bidang deteksi
+    def tracks(self):
+        with self._lock:
+            return [{'id': track.id, 'box': track.box, 'hits': track.hits,
+                     'misses': track.misses, 'is_visible': track.is_visible,
+                     'is_target': track.id == self.target_id}
+                    for track in self._tracks]
+
+    def clear(self):
+        with self._lock:
+            self._tracks = []
+            if self.policy != TARGET_POLICY_ID:
+                self.target_id = None
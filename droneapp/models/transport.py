@@ -0,0 +1,306 @@
+# import library
+import asyncio
+import collections
+import logging
+import socket
+import threading
+import time
+
+from droneapp.models.command import COMMAND_QUEUE_SIZE
+from droneapp.models.command import command_policy
+from droneapp.models.command import CommandResult
+from droneapp.models.command import completed_future
+from droneapp.models.command import LATE_RESPONSES
+from droneapp.models.command import record_command
+from droneapp.models.command import UNMATCHED_RESPONSES
+from droneapp.models.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# batas data yang boleh menumpuk di pipe ffmpeg sebelum frame dibuang
+DECODER_BACKLOG_LIMIT = 4 << 20
+
+DECODER_OVERFLOWS = REGISTRY.counter(
+    'video_decoder_overflows',
+    'Frames dropped because the decoder pipe was full')
+
+
+# protocol UDP yang meneruskan setiap datagram ke callback
+# callback dipanggil di thread loop dengan (data, waktu terima)
+class _DatagramProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, name, on_datagram):
+        self.name = name
+        self._on_datagram = on_datagram
+
+    def datagram_received(self, data, addr):
+        try:
+            self._on_datagram(data, time.time())
+        except Exception as ex:
+            logger.error({'action': self.name, 'ex': ex})
+
+    def error_received(self, ex):
+        logger.error({'action': self.name, 'ex': ex})
+
+
+# class untuk event loop asyncio yang berjalan di thread sendiri
+# satu IOLoop bisa dipakai bersama oleh beberapa DroneIO (fleet)
+class IOLoop(object):
+
+    def __init__(self, name='drone_io'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    # fungsi untuk menjalankan coroutine di loop dari thread lain
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    # fungsi untuk menghentikan loop dan menunggu thread selesai
+    def stop(self, timeout=None):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+
+# class untuk semua I/O satu drone di event loop asyncio
+# socket perintah, status dan video serta pipe ke ffmpeg dilayani satu
+# thread, perintah berupa coroutine yang bisa dibatalkan dan thread lain
+# memakai send_command yang mengembalikan future seperti sebelumnya
+# tanpa io_loop DroneIO membuat loop sendiri
+class DroneIO(object):
+
+    def __init__(self, drone_address, io_loop=None):
+        self.drone_address = drone_address
+        self._owns_loop = io_loop is None
+        self.io_loop = IOLoop() if io_loop is None else io_loop
+        self.loop = self.io_loop.loop
+        self.response = None
+        self.unmatched = 0
+        self.late = 0
+        # batas waktu respon yang masih terutang dari perintah yang timeout
+        self._owed = collections.deque()
+        self._pending_lock = threading.Lock()
+        self._futures = set()
+        self._transports = {}
+        self._response = None
+        self._command_lock = None
+        self._decoder = None
+        self._is_closed = False
+        self.run(self._setup()).result()
+
+    async def _setup(self):
+        # lock dibuat di dalam loop agar terikat ke loop ini
+        self._command_lock = asyncio.Lock()
+
+    # fungsi untuk menjalankan coroutine di loop dari thread lain
+    def run(self, coro):
+        return self.io_loop.run(coro)
+
+    # jumlah perintah yang mengantri atau sedang menunggu respon
+    @property
+    def pending(self):
+        return len(self._futures)
+
+    # fungsi untuk membuka socket UDP dan mendaftarkannya ke loop
+    # socket di-bind di thread pemanggil agar error bind langsung terlihat
+    # reuse_address hanya untuk video, port perintah dan status yang sudah
+    # dipakai harus gagal agar respon drone tidak diterima socket lain
+    def open_udp(self, name, local_address, on_datagram, recv_buffer=None,
+                 reuse_address=False):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if reuse_address:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if recv_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_buffer)
+        try:
+            sock.bind(local_address)
+        except OSError:
+            sock.close()
+            raise
+
+        async def create():
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(name, on_datagram), sock=sock)
+            self._transports[name] = transport
+
+        self.run(create()).result()
+
+    # fungsi untuk membuka socket perintah, respon drone diterima di sini
+    def open_command(self, local_address):
+        self.open_udp('command', local_address, self._on_response)
+
+    # respon terlambat dari perintah yang sudah timeout dibuang lebih dulu
+    # agar tidak dianggap sebagai jawaban perintah yang sedang menunggu
+    def _on_response(self, data, received_at):
+        self.response = data
+        logger.info({'action': 'receive_response', 'response': data})
+        now = time.monotonic()
+        while self._owed and self._owed[0] < now:
+            self._owed.popleft()
+        if self._owed:
+            self._owed.popleft()
+            self.late += 1
+            LATE_RESPONSES.inc()
+            logger.warning({'action': 'dispatch', 'response': data,
+                            'status': 'late'})
+            return
+        future = self._response
+        if future is None or future.done():
+            self.unmatched += 1
+            UNMATCHED_RESPONSES.inc()
+            logger.warning({'action': 'dispatch', 'response': data,
+                            'status': 'unmatched'})
+            return
+        future.set_result((data, time.monotonic()))
+
+    # fungsi untuk menjalankan ffmpeg dengan stdin sebagai stream asyncio
+    # stdout diarahkan ke file descriptor yang dibaca thread decode
+    def start_decoder(self, args, stdout):
+        async def create():
+            self._decoder = await asyncio.create_subprocess_exec(
+                *args, stdin=asyncio.subprocess.PIPE, stdout=stdout)
+            return self._decoder
+
+        return self.run(create()).result()
+
+    @property
+    def decoder_backlog(self):
+        decoder = self._decoder
+        if decoder is None or decoder.stdin.is_closing():
+            return 0
+        return decoder.stdin.transport.get_write_buffer_size()
+
+    # fungsi untuk menulis data ke ffmpeg tanpa menunggu, hanya dari loop
+    # mengembalikan False jika pipe masih penuh dan data dibuang
+    def write_decoder(self, *chunks):
+        decoder = self._decoder
+        if decoder is None or decoder.stdin.is_closing():
+            return False
+        if self.decoder_backlog > DECODER_BACKLOG_LIMIT:
+            DECODER_OVERFLOWS.inc()
+            return False
+        for chunk in chunks:
+            decoder.stdin.write(chunk)
+        return True
+
+    # coroutine untuk mengirim satu perintah dan menunggu respon dengan retry
+    # jika blocking=False perintah dibuang saat drone masih sibuk
+    async def command(self, command, blocking=True, timeout=None, retry=None):
+        if not blocking and self._command_lock.locked():
+            logger.warning({'action': 'send_command', 'command': command,
+                            'status': 'not_acquire'})
+            return record_command(
+                CommandResult(command, None, 'not_acquire', None, 0))
+
+        default_timeout, default_retry = command_policy(command)
+        if timeout is None:
+            timeout = default_timeout
+        if retry is None:
+            retry = default_retry
+        async with self._command_lock:
+            return record_command(
+                await self._send_with_retry(command, timeout, retry))
+
+    async def _send_with_retry(self, command, timeout, retry):
+        attempt = 0
+        while attempt <= retry:
+            attempt += 1
+            logger.info({'action': 'send_command', 'command': command,
+                         'attempt': attempt})
+            self._response = self.loop.create_future()
+            sent_at = time.monotonic()
+            try:
+                self._transports['command'].sendto(command.encode('utf-8'),
+                                                   self.drone_address)
+                response, received_at = await asyncio.wait_for(
+                    self._response, timeout)
+            except asyncio.TimeoutError:
+                # drone mungkin tetap menjawab setelah timeout
+                self._owe_response(timeout)
+                continue
+            except asyncio.CancelledError:
+                # perintah dibatalkan (misi dihentikan) tapi drone tetap
+                # menjawab setelah manuver selesai
+                self._owe_response(timeout)
+                raise
+            finally:
+                self._response = None
+
+            rtt = received_at - sent_at
+            response = response.decode('utf-8', errors='replace').strip()
+            status = 'error' if response.startswith('error') else 'ok'
+            logger.info({'action': 'send_command', 'command': command,
+                         'response': response, 'rtt': rtt})
+            return CommandResult(command, response, status, rtt, attempt)
+
+        logger.warning({'action': 'send_command', 'command': command,
+                        'status': 'timeout', 'attempts': attempt})
+        return CommandResult(command, None, 'timeout', None, attempt)
+
+    # respon yang masih terutang dibuang jika tiba dalam satu timeout lagi
+    # dipakai untuk perintah yang timeout maupun yang dibatalkan
+    def _owe_response(self, timeout):
+        self._owed.append(time.monotonic() + timeout)
+
+    # fungsi untuk thread lain, mengembalikan future berisi CommandResult
+    # future.cancel() membatalkan perintah yang masih menunggu
+    # jika sudah ada COMMAND_QUEUE_SIZE perintah mengantri, perintah ditolak
+    def send_command(self, command, blocking=True, timeout=None, retry=None):
+        with self._pending_lock:
+            is_full = len(self._futures) >= COMMAND_QUEUE_SIZE
+            if not (self._is_closed or is_full):
+                future = self.run(
+                    self.command(command, blocking, timeout, retry))
+                self._futures.add(future)
+        if self._is_closed or is_full:
+            logger.warning({'action': 'send_command', 'command': command,
+                            'status': 'not_acquire', 'queue_full': is_full})
+            return completed_future(record_command(
+                CommandResult(command, None, 'not_acquire', None, 0)))
+        future.add_done_callback(self._command_done)
+        return future
+
+    def _command_done(self, future):
+        with self._pending_lock:
+            self._futures.discard(future)
+
+    # fungsi untuk mengirim datagram tanpa menunggu balasan (misalnya rc)
+    def send(self, data):
+        if not self._is_closed:
+            self.loop.call_soon_threadsafe(self._send, data)
+
+    def _send(self, data):
+        transport = self._transports.get('command')
+        if transport is not None:
+            transport.sendto(data, self.drone_address)
+
+    async def _close(self):
+        # hanya perintah milik drone ini, loop bisa dipakai drone lain
+        with self._pending_lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+        for transport in self._transports.values():
+            transport.close()
+        if self._decoder is not None and self._decoder.returncode is None:
+            self._decoder.stdin.close()
+            self._decoder.kill()
+            await self._decoder.wait()
+
+    # fungsi untuk menutup semua socket dan ffmpeg di thread loop
+    # loop ikut dihentikan jika dibuat oleh DroneIO ini
+    def stop(self, timeout=None):
+        if self._is_closed:
+            return
+        self._is_closed = True
+        try:
+            self.run(self._close()).result(timeout)
+        except Exception as ex:
+            logger.error({'action': 'drone_io', 'ex': ex})
+        if self._owns_loop:
+            self.io_loop.stop(timeout)
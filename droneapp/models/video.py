@@ -0,0 +1,288 @@
+# import library
+import collections
+import logging
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+from droneapp.models.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# jumlah buffer frame yang dialokasikan di awal
+FRAME_RING_SIZE = 8
+
+# tingkat kualitas pengiriman MJPEG, tingkat 0 adalah hasil encode producer
+DeliveryTier = collections.namedtuple(
+    'DeliveryTier', ['quality', 'scale', 'fps'])
+DELIVERY_TIERS = (
+    DeliveryTier(90, 1.0, 30),
+    DeliveryTier(75, 0.75, 20),
+    DeliveryTier(65, 0.5, 15),
+    DeliveryTier(55, 0.5, 10),
+    DeliveryTier(45, 0.33, 5),
+)
+
+# penonton turun tingkat jika waktu tulis melebihi setengah jarak frame
+# beberapa kali berturut-turut, naik lagi jika cukup lama jauh di bawahnya
+SLOW_WRITE_RATIO = 0.5
+FAST_WRITE_RATIO = 0.15
+DOWNGRADE_AFTER = 3
+UPGRADE_AFTER = 60
+
+# jumlah hasil encode per tingkat yang disimpan
+TIER_CACHE_SIZE = 16
+
+
+# fungsi untuk histogram lama waktu satu tahap pipeline video
+def stage_histogram(stage):
+    return REGISTRY.histogram('video_stage_seconds',
+                              'Time spent in each video pipeline stage',
+                              {'stage': stage})
+
+
+# fungsi untuk histogram umur frame dihitung dari waktu tangkap frame
+def frame_age_histogram(stage):
+    return REGISTRY.histogram('video_frame_age_seconds',
+                              'Frame age relative to capture time per stage',
+                              {'stage': stage})
+
+
+# frame jpeg yang sudah di-encode beserta nomor dan waktu tangkap frame
+# frame adalah Frame asal dari ring buffer untuk encode tingkat lain
+EncodedFrame = collections.namedtuple(
+    'EncodedFrame', ['jpeg', 'seq', 'timestamp', 'frame'], defaults=(None, ))
+
+
+# class untuk satu frame yang dipinjam dari ring buffer
+# image hanya valid sampai ring berputar kembali ke slot yang sama
+class Frame(object):
+    __slots__ = ('image', 'seq', 'timestamp', 'slot')
+
+    def __init__(self, image, seq, timestamp, slot):
+        self.image = image
+        self.seq = seq
+        self.timestamp = timestamp
+        self.slot = slot
+
+
+# class untuk ring buffer frame numpy yang dialokasikan sekali
+# frame dibaca langsung ke buffer dengan readinto tanpa salinan
+class FrameRing(object):
+
+    def __init__(self, shape, size=FRAME_RING_SIZE, dtype=np.uint8):
+        self._buffers = [np.empty(shape, dtype) for _ in range(size)]
+        self._views = [memoryview(buffer).cast('B')
+                       for buffer in self._buffers]
+        self._slot_seq = [0] * size
+        self.frame_bytes = self._buffers[0].nbytes
+        self.seq = 0
+
+    # fungsi untuk membaca satu frame utuh dari stream
+    # mengembalikan None jika stream berakhir di tengah frame
+    def read_from(self, stream):
+        slot = self.seq % len(self._buffers)
+        view = self._views[slot]
+        # slot ditandai tidak valid selama sedang ditimpa
+        self._slot_seq[slot] = 0
+        filled = 0
+        while filled < self.frame_bytes:
+            size = stream.readinto(view[filled:])
+            if not size:
+                return None
+            filled += size
+
+        self.seq += 1
+        self._slot_seq[slot] = self.seq
+        return Frame(self._buffers[slot], self.seq, time.time(), slot)
+
+    # fungsi untuk mengecek apakah frame belum ditimpa frame baru
+    def is_valid(self, frame):
+        return self._slot_seq[frame.slot] == frame.seq
+
+
+# class untuk membagikan frame terbaru ke banyak penonton
+# producer menerbitkan frame satu kali, setiap subscriber hanya mengambil
+# frame paling baru sehingga frame lama dilewati dan tidak menumpuk
+class FrameHub(object):
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._frame = None
+        self._is_closed = False
+        self.subscribers = 0
+
+    # fungsi untuk menerbitkan frame baru ke semua subscriber
+    def publish(self, frame):
+        with self._cond:
+            self._seq += 1
+            self._frame = frame
+            self._cond.notify_all()
+
+    # fungsi untuk mengambil frame terbaru tanpa menunggu
+    def latest(self):
+        with self._cond:
+            return self._seq, self._frame
+
+    # fungsi untuk menunggu frame yang lebih baru dari last_seq
+    # mengembalikan (last_seq, None) jika timeout atau hub ditutup
+    def wait(self, last_seq, timeout=None):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq > last_seq or self._is_closed, timeout)
+            if self._seq > last_seq:
+                return self._seq, self._frame
+            return last_seq, None
+
+    # generator frame terbaru untuk satu penonton
+    def subscribe(self):
+        with self._cond:
+            self.subscribers += 1
+        try:
+            seq = 0
+            while not self._is_closed:
+                seq, frame = self.wait(seq)
+                if frame is not None:
+                    yield frame
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    # fungsi untuk menutup hub dan membangunkan semua subscriber
+    def close(self):
+        with self._cond:
+            self._is_closed = True
+            self._cond.notify_all()
+
+
+# class untuk aturan pengiriman MJPEG satu penonton
+# fps, kualitas dan skala diatur dari waktu tulis yang diukur, frame yang
+# tidak sempat dikirim dilewati dan tidak pernah diantrekan
+class DeliveryPolicy(object):
+
+    def __init__(self, tiers=DELIVERY_TIERS, tier=0):
+        self.tiers = tiers
+        self.tier = min(max(int(tier), 0), len(tiers) - 1)
+        self.write_time = 0.0
+        self.sent = 0
+        self.skipped = 0
+        self._last_sent = None
+        self._slow = 0
+        self._fast = 0
+
+    @property
+    def current(self):
+        return self.tiers[self.tier]
+
+    # fungsi untuk mengecek apakah frame boleh dikirim sesuai fps tingkat
+    def should_send(self, now):
+        interval = 1.0 / self.current.fps
+        # toleransi 10% agar jitter frame tidak membuang frame yang pas
+        if (self._last_sent is not None
+                and now - self._last_sent < interval * 0.9):
+            self.skipped += 1
+            return False
+        return True
+
+    # fungsi untuk mencatat lama menulis satu frame ke klien
+    def record(self, started, finished):
+        write_time = finished - started
+        self._last_sent = started
+        self.sent += 1
+        self.write_time += (write_time - self.write_time) * 0.1
+
+        budget = 1.0 / self.current.fps
+        if write_time > budget * SLOW_WRITE_RATIO:
+            self._slow += 1
+            self._fast = 0
+            if (self._slow >= DOWNGRADE_AFTER
+                    and self.tier < len(self.tiers) - 1):
+                self.tier += 1
+                self._slow = 0
+        elif write_time < budget * FAST_WRITE_RATIO:
+            self._fast += 1
+            self._slow = 0
+            if self._fast >= UPGRADE_AFTER and self.tier > 0:
+                self.tier -= 1
+                self._fast = 0
+        else:
+            self._slow = self._fast = 0
+
+
+class _CacheEntry(object):
+    __slots__ = ('event', 'jpeg')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.jpeg = None
+
+
+# class untuk menyimpan hasil encode per (seq, tingkat)
+# penonton di tingkat yang sama berbagi satu kali encode, frame dibaca
+# langsung dari ring buffer dan dibuang jika sudah ditimpa frame baru
+class TierCache(object):
+
+    def __init__(self, ring, tiers=DELIVERY_TIERS, size=TIER_CACHE_SIZE):
+        self._ring = ring
+        self.tiers = tiers
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    # fungsi untuk mengambil jpeg frame pada tingkat tertentu
+    # mengembalikan None jika frame asal sudah ditimpa
+    def get(self, encoded, tier):
+        if tier == 0 or encoded.frame is None:
+            return encoded.jpeg
+
+        key = (encoded.seq, tier)
+        with self._lock:
+            entry = self._entries.get(key)
+            is_owner = entry is None
+            if is_owner:
+                self.misses += 1
+                entry = self._entries[key] = _CacheEntry()
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+            else:
+                self.hits += 1
+
+        if not is_owner:
+            entry.event.wait(1.0)
+            return entry.jpeg
+
+        try:
+            entry.jpeg = self._encode(encoded.frame, self.tiers[tier])
+        finally:
+            entry.event.set()
+        if entry.jpeg is None:
+            with self._lock:
+                self._entries.pop(key, None)
+        return entry.jpeg
+
+    def _encode(self, frame, tier):
+        if not self._ring.is_valid(frame):
+            self.stale += 1
+            return None
+        image = frame.image
+        if tier.scale != 1.0:
+            image = cv.resize(image, None, fx=tier.scale, fy=tier.scale,
+                              interpolation=cv.INTER_AREA)
+        _, jpeg = cv.imencode('.jpg', image,
+                              [cv.IMWRITE_JPEG_QUALITY, tier.quality])
+        # slot ditimpa selama encode, hasilnya bisa campuran dua frame
+        if not self._ring.is_valid(frame):
+            self.stale += 1
+            return None
+        return jpeg.tobytes()
+
+    def stats(self):
+        return {'tier_cache_hits': self.hits,
+                'tier_cache_misses': self.misses,
+                'tier_cache_stale': self.stale}
@@ -0,0 +1,302 @@
+# import library
+import argparse
+import heapq
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+
+from droneapp.models.h264 import split_access_units
+
+logger = logging.getLogger(__name__)
+
+# port bawaan Tello SDK
+COMMAND_PORT = 8889
+STATE_PORT = 8890
+VIDEO_PORT = 11111
+
+# ukuran datagram video dan laju frame yang dikirim Tello
+VIDEO_PACKET_SIZE = 1460
+VIDEO_FPS = 30
+
+# berapa kali per detik status drone dikirim
+STATE_RATE = 10
+
+# perintah yang hanya membaca nilai dan jawabannya
+READ_COMMANDS = {
+    'battery?': lambda state: str(state['bat']),
+    'speed?': lambda state: str(state['speed']),
+    'time?': lambda state: f"{state['time']}s",
+    'height?': lambda state: f"{state['h']}dm",
+    'temp?': lambda state: f"{state['templ']}~{state['temph']}C",
+    'attitude?': lambda state: (f"pitch:{state['pitch']};roll:{state['roll']};"
+                                f"yaw:{state['yaw']};"),
+    'baro?': lambda state: f"{state['baro']:.2f}",
+    'tof?': lambda state: f"{state['tof']}mm",
+    'wifi?': lambda state: '90',
+    'sdk?': lambda state: '20',
+    'sn?': lambda state: 'SIMULATOR000000',
+}
+
+# kecepatan gerak dan putar simulasi (cm/s dan derajat/s)
+MOTION_SPEED = 50.0
+ROTATION_SPEED = 90.0
+TAKEOFF_TIME = 3.0
+
+
+# class untuk mensimulasikan drone Tello lewat UDP
+# menjawab perintah SDK, mengirim status ke port 8890 dan video ke 11111
+class TelloSimulator(object):
+
+    def __init__(self, host='127.0.0.1', command_port=COMMAND_PORT,
+                 state_port=STATE_PORT, video_port=VIDEO_PORT,
+                 video_file=None, latency=0.02, jitter=0.01, loss=0.0,
+                 fps=VIDEO_FPS, packet_size=VIDEO_PACKET_SIZE,
+                 state_rate=STATE_RATE, simulate_motion=False, seed=None):
+        self.host = host
+        self.command_port = command_port
+        self.state_port = state_port
+        self.video_port = video_port
+        self.video_file = video_file
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.fps = fps
+        self.packet_size = packet_size
+        self.state_rate = state_rate
+        self.simulate_motion = simulate_motion
+        self._random = random.Random(seed)
+
+        self.client_ip = None
+        self.is_streaming = False
+        self.state = {'pitch': 0, 'roll': 0, 'yaw': 0, 'vgx': 0, 'vgy': 0,
+                      'vgz': 0, 'templ': 60, 'temph': 63, 'tof': 10, 'h': 0,
+                      'bat': 100, 'baro': 100.0, 'time': 0, 'agx': 0.0,
+                      'agy': 0.0, 'agz': -1000.0, 'speed': 10}
+        self.received = 0
+        self.replied = 0
+        self.lost = 0
+        self.video_packets = 0
+
+        self.stop_event = threading.Event()
+        self._replies = []
+        self._replies_cond = threading.Condition()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((self.host, self.command_port))
+        self.socket.settimeout(0.5)
+        self._threads = []
+
+    # fungsi untuk menjalankan semua thread simulator
+    def start(self):
+        for target in (self._receive_command, self._send_replies,
+                       self._send_state, self._send_video):
+            thread = threading.Thread(target=target, name=target.__name__,
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info({'action': 'simulator_start',
+                     'address': (self.host, self.command_port)})
+
+    # fungsi untuk menghentikan simulator
+    def stop(self):
+        self.stop_event.set()
+        with self._replies_cond:
+            self._replies_cond.notify()
+        for thread in self._threads:
+            thread.join(2)
+        self.socket.close()
+
+    def _receive_command(self):
+        while not self.stop_event.is_set():
+            try:
+                data, address = self.socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except socket.error as ex:
+                logger.error({'action': 'simulator_command', 'ex': ex})
+                break
+            self.received += 1
+            self.client_ip = address[0]
+            command = data.decode('utf-8', errors='replace').strip()
+            response, duration = self.handle(command)
+            if response is None:
+                continue
+            if self._random.random() < self.loss:
+                self.lost += 1
+                continue
+            delay = duration + max(
+                0.0, self.latency + self._random.uniform(-self.jitter,
+                                                         self.jitter))
+            with self._replies_cond:
+                heapq.heappush(self._replies, (time.monotonic() + delay,
+                                               self.received, response,
+                                               address))
+                self._replies_cond.notify()
+
+    # fungsi untuk mengirim jawaban sesuai waktu yang dijadwalkan
+    def _send_replies(self):
+        while not self.stop_event.is_set():
+            with self._replies_cond:
+                if not self._replies:
+                    self._replies_cond.wait()
+                    continue
+                due, _, response, address = self._replies[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._replies_cond.wait(delay)
+                    continue
+                heapq.heappop(self._replies)
+            self.socket.sendto(response.encode('utf-8'), address)
+            self.replied += 1
+
+    # fungsi untuk menjawab satu perintah SDK
+    # mengembalikan (jawaban, lama gerakan), jawaban None untuk rc
+    def handle(self, command):
+        parts = command.split()
+        if not parts:
+            return 'error', 0.0
+        name, args = parts[0], parts[1:]
+        state = self.state
+
+        if name in READ_COMMANDS:
+            return READ_COMMANDS[name](state), 0.0
+        if name == 'rc':
+            return None, 0.0
+        if name in ('command', 'emergency', 'stop'):
+            return 'ok', 0.0
+        if name == 'streamon':
+            self.is_streaming = True
+            return 'ok', 0.0
+        if name == 'streamoff':
+            self.is_streaming = False
+            return 'ok', 0.0
+        if name == 'takeoff':
+            state['h'] = 80
+            return 'ok', self._motion_time(TAKEOFF_TIME)
+        if name == 'land':
+            state['h'] = 0
+            return 'ok', self._motion_time(TAKEOFF_TIME)
+
+        try:
+            values = [int(float(arg)) for arg in args]
+        except ValueError:
+            return 'error', 0.0
+        if name == 'speed' and len(values) == 1:
+            state['speed'] = values[0]
+            return 'ok', 0.0
+        if name in ('up', 'down', 'left', 'right', 'forward', 'back') \
+                and len(values) == 1:
+            if name == 'up':
+                state['h'] += values[0]
+            if name == 'down':
+                state['h'] = max(0, state['h'] - values[0])
+            return 'ok', self._motion_time(values[0] / MOTION_SPEED)
+        if name in ('cw', 'ccw') and len(values) == 1:
+            sign = 1 if name == 'cw' else -1
+            state['yaw'] = (state['yaw'] + sign * values[0] + 180) % 360 - 180
+            return 'ok', self._motion_time(values[0] / ROTATION_SPEED)
+        if name == 'flip' and args:
+            return 'ok', self._motion_time(1.0)
+        if name == 'go' and len(values) == 4:
+            x, y, z, speed = values
+            if all(-20 <= v <= 20 for v in (x, y, z)):
+                return 'error', 0.0
+            state['h'] += z
+            distance = (x * x + y * y + z * z) ** 0.5
+            return 'ok', self._motion_time(distance / max(speed, 1))
+        return 'error', 0.0
+
+    def _motion_time(self, seconds):
+        return seconds if self.simulate_motion else 0.0
+
+    # fungsi untuk mengirim status drone ke port 8890
+    def _send_state(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock_state:
+            started = time.monotonic()
+            interval = 1.0 / self.state_rate
+            next_time = time.monotonic()
+            while not self.stop_event.is_set():
+                next_time += interval
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    self.stop_event.wait(delay)
+                if self.client_ip is None:
+                    continue
+                state = self.state
+                state['time'] = int(time.monotonic() - started)
+                state['bat'] = max(0, 100 - state['time'] // 60)
+                message = (
+                    f"pitch:{state['pitch']};roll:{state['roll']};"
+                    f"yaw:{state['yaw']};vgx:{state['vgx']};"
+                    f"vgy:{state['vgy']};vgz:{state['vgz']};"
+                    f"templ:{state['templ']};temph:{state['temph']};"
+                    f"tof:{state['tof'] + state['h']};h:{state['h']};"
+                    f"bat:{state['bat']};baro:{state['baro']:.2f};"
+                    f"time:{state['time']};agx:{state['agx']:.2f};"
+                    f"agy:{state['agy']:.2f};agz:{state['agz']:.2f};\r\n")
+                sock_state.sendto(message.encode('utf-8'),
+                                  (self.client_ip, self.state_port))
+
+    # fungsi untuk mengirim file H.264 sebagai datagram video
+    # satu frame dikirim dalam beberapa paket sesuai laju frame
+    def _send_video(self):
+        if self.video_file is None:
+            return
+        with open(self.video_file, 'rb') as f:
+            frames = split_access_units(f.read())
+        if not frames:
+            logger.error({'action': 'simulator_video',
+                          'status': 'no_frames', 'file': self.video_file})
+            return
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock_video:
+            interval = 1.0 / self.fps
+            next_time = time.monotonic()
+            index = 0
+            while not self.stop_event.is_set():
+                next_time += interval
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    self.stop_event.wait(delay)
+                if not self.is_streaming or self.client_ip is None:
+                    continue
+                frame = frames[index % len(frames)]
+                index += 1
+                for i in range(0, len(frame), self.packet_size):
+                    sock_video.sendto(frame[i:i + self.packet_size],
+                                      (self.client_ip, self.video_port))
+                    self.video_packets += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tello SDK simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--command-port', type=int, default=COMMAND_PORT)
+    parser.add_argument('--state-port', type=int, default=STATE_PORT)
+    parser.add_argument('--video-port', type=int, default=VIDEO_PORT)
+    parser.add_argument('--video', help='H.264 Annex-B file to stream')
+    parser.add_argument('--fps', type=float, default=VIDEO_FPS)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--simulate-motion', action='store_true')
+    args = parser.parse_args(argv)
+
+    simulator = TelloSimulator(
+        host=args.host, command_port=args.command_port,
+        state_port=args.state_port, video_port=args.video_port,
+        video_file=args.video, latency=args.latency, jitter=args.jitter,
+        loss=args.loss, fps=args.fps, simulate_motion=args.simulate_motion)
+    simulator.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    main()